@@ -1,31 +1,94 @@
-import math
+import numpy as np
 import pandas as pd
 from typing import List, Dict, Any, Optional, Tuple
-from datetime import datetime
 import warnings
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
 warnings.filterwarnings('ignore')
 
 from .db import get_weather_collection, get_anomaly_collection
 from .models import Anomaly, WeatherDataType, AnomalySeverity
+from .cache import TTLCache
+
+# Only the fields the detectors read are pulled from MongoDB
+WEATHER_PROJECTION = {
+    "year": 1, "month": 1, "pr_total": 1,
+    "tasmax_avg": 1, "tasmin_avg": 1, "tas_avg": 1
+}
+
+# Metrics analysed by the notebook methodology (DataFrame column names)
+NOTEBOOK_METRICS = ('pr', 'tasmax', 'tasmin')
+
+# Anomaly type, bound description formatter and stored metric_type per metric
+NOTEBOOK_METRIC_INFO = {
+    'pr': (
+        WeatherDataType.PRECIPITATION,
+        "Precipitation anomaly in {year}-{month:02d}: {value:.2f}mm (monthly avg: {avg:.2f}mm, anomaly: {deviation:.2f}mm, z-score: {z_score:.2f})".format,
+        None
+    ),
+    'tasmax': (
+        WeatherDataType.TEMPERATURE,
+        "Maximum temperature anomaly in {year}-{month:02d}: {value:.2f}°C (monthly avg: {avg:.2f}°C, anomaly: {deviation:.2f}°C, z-score: {z_score:.2f})".format,
+        'tasmax'
+    ),
+    'tasmin': (
+        WeatherDataType.TEMPERATURE,
+        "Minimum temperature anomaly in {year}-{month:02d}: {value:.2f}°C (monthly avg: {avg:.2f}°C, anomaly: {deviation:.2f}°C, z-score: {z_score:.2f})".format,
+        'tasmin'
+    )
+}
+
+# |z-score| lower bounds for MEDIUM, HIGH and EXTREME severity
+SEVERITY_THRESHOLDS = np.array([1.5, 2.0, 2.5])
+SEVERITY_LEVELS = np.array([
+    AnomalySeverity.LOW, AnomalySeverity.MEDIUM,
+    AnomalySeverity.HIGH, AnomalySeverity.EXTREME
+], dtype=object)
+
+# Monthly record checks: (metric, extreme, anomaly type, bound description formatter)
+EXTREME_EVENT_SPECS = (
+    ('tasmax', 'max', WeatherDataType.TEMPERATURE,
+     "Record high temperature for month {month}: {value:.2f}°C in {year} (z-score: {z_score:.2f})".format),
+    ('tasmin', 'min', WeatherDataType.TEMPERATURE,
+     "Record low temperature for month {month}: {value:.2f}°C in {year} (z-score: {z_score:.2f})".format),
+    ('pr', 'max', WeatherDataType.PRECIPITATION,
+     "Record high precipitation for month {month}: {value:.2f}mm in {year} (z-score: {z_score:.2f})".format)
+)
+
+def monthly_mean_std(month_codes: np.ndarray, month_counts: np.ndarray,
+                     values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Per-month mean and sample std (ddof=1) of values, broadcast back to each row.
+    month_codes are dense group codes (e.g. from pd.factorize); months with a
+    single observation get a NaN std, matching pandas.
+    """
+    means = np.bincount(month_codes, weights=values) / month_counts
+    row_means = means[month_codes]
+    deviations = values - row_means
+    with np.errstate(divide='ignore', invalid='ignore'):
+        stds = np.sqrt(np.bincount(month_codes, weights=deviations * deviations) / (month_counts - 1))
+    return row_means, stds[month_codes]
 
 class AnomalyDetector:
     def __init__(self):
         self.weather_collection = get_weather_collection()
         self.anomaly_collection = get_anomaly_collection()
+        # Per-process, so entries expire after DATA_CACHE_TTL to pick up writes made by other workers
+        self._weather_arrays_cache = TTLCache(maxsize=32)
         
-    def calculate_mean(self, values: List[float]) -> float:
-        """Calculate mean of a list of values"""
-        if not values:
+    def calculate_mean(self, values) -> float:
+        """Calculate mean of a list or array of values"""
+        arr = np.asarray(values, dtype=np.float64)
+        if arr.size == 0:
             return 0.0
-        return sum(values) / len(values)
+        return float(arr.mean())
     
-    def calculate_std(self, values: List[float]) -> float:
-        """Calculate standard deviation of a list of values"""
-        if len(values) < 2:
+    def calculate_std(self, values) -> float:
+        """Calculate sample standard deviation of a list or array of values"""
+        arr = np.asarray(values, dtype=np.float64)
+        if arr.size < 2:
             return 0.0
-        mean_val = self.calculate_mean(values)
-        variance = sum((x - mean_val) ** 2 for x in values) / (len(values) - 1)
-        return math.sqrt(variance)
+        return float(arr.std(ddof=1))
     
     def calculate_z_score(self, value: float, mean: float, std: float) -> float:
         """Calculate z-score for a value"""
@@ -45,32 +108,63 @@ class AnomalyDetector:
         else:
             return AnomalySeverity.LOW
     
+    def determine_severities(self, z_scores: np.ndarray) -> np.ndarray:
+        """Vectorized determine_severity for an array of z-scores"""
+        return SEVERITY_LEVELS[np.searchsorted(SEVERITY_THRESHOLDS, np.abs(z_scores), side='right')]
+    
+    def _load_weather_arrays(self, location: str) -> Dict[str, np.ndarray]:
+        """
+        Load a location's weather records (sorted by year) as read-only column arrays.
+        Cached per location for DATA_CACHE_TTL seconds; invalidate_cache() drops them early.
+        """
+        arrays = self._weather_arrays_cache.get(location)
+        if arrays is not None:
+            return arrays
+        
+        weather_data = list(self.weather_collection.find({"location": location}, WEATHER_PROJECTION).sort([("year", 1), ("month", 1)]))
+        n = len(weather_data)
+        
+        # Calendar fields are downcast; metrics stay float64 so stored values keep full precision
+        arrays = {
+            '_id': np.array([str(r['_id']) for r in weather_data], dtype=object),
+            'year': np.fromiter((r['year'] for r in weather_data), dtype=np.int16, count=n),
+            'month': np.fromiter((r.get('month') or 1 for r in weather_data), dtype=np.int8, count=n),
+            'pr': np.fromiter((r['pr_total'] for r in weather_data), dtype=np.float64, count=n),
+            'tasmax': np.fromiter((r['tasmax_avg'] for r in weather_data), dtype=np.float64, count=n),
+            'tasmin': np.fromiter((r['tasmin_avg'] for r in weather_data), dtype=np.float64, count=n),
+            'tas_avg': np.fromiter((r.get('tas_avg', np.nan) for r in weather_data), dtype=np.float64, count=n)
+        }
+        for arr in arrays.values():
+            arr.setflags(write=False)
+        
+        self._weather_arrays_cache.set(location, arrays)
+        return arrays
+    
     def get_weather_dataframe(self, location: str = "default") -> pd.DataFrame:
         """
         Convert MongoDB weather data to pandas DataFrame matching notebook structure
         """
         try:
-            weather_data = list(self.weather_collection.find({"location": location}).sort("year", 1))
+            arrays = self._load_weather_arrays(location)
             
-            if not weather_data:
+            if not len(arrays['_id']):
                 return pd.DataFrame()
             
-            # Convert to DataFrame matching notebook structure
-            df_data = []
-            for record in weather_data:
-                df_data.append({
-                    '_id': str(record['_id']),
-                    'date': datetime(record['year'], record.get('month', 1), 1),
-                    'year': record['year'],
-                    'month': record.get('month', 1),
-                    'pr': record['pr_total'],  # precipitation
-                    'tasmax': record['tasmax_avg'],  # max temperature
-                    'tasmin': record['tasmin_avg'],  # min temperature
-                    'location': location
-                })
-            
-            df = pd.DataFrame(df_data)
-            df['date'] = pd.to_datetime(df['date'])
+            # Build DataFrame column-wise, matching notebook structure
+            df = pd.DataFrame({
+                '_id': arrays['_id'],
+                'year': arrays['year'],
+                'month': arrays['month'],
+                'pr': arrays['pr'],  # precipitation
+                'tasmax': arrays['tasmax'],  # max temperature
+                'tasmin': arrays['tasmin'],  # min temperature
+                'location': location
+            })
+            df.insert(1, 'date', pd.to_datetime(pd.DataFrame({
+                'year': df['year'],
+                'month': df['month'],
+                'day': 1
+            })))
             
             return df
             
@@ -84,7 +178,7 @@ class AnomalyDetector:
         """
         try:
             # Calculate monthly averages for each indicator
-            monthly_averages = df.groupby('month').agg({
+            monthly_averages = df.groupby('month', sort=False).agg({
                 'pr': 'mean',
                 'tasmax': 'mean', 
                 'tasmin': 'mean'
@@ -108,33 +202,27 @@ class AnomalyDetector:
         Calculate anomalies and z-scores exactly as in the notebook
         """
         try:
-            # Get monthly historical averages
-            monthly_averages = self.calculate_monthly_historical_averages(df)
+            df_anomalies = df.copy()
+            
+            # Per-month reductions indexed by month code (one bincount pass each)
+            month_codes, _ = pd.factorize(df_anomalies['month'])
+            month_counts = np.bincount(month_codes)
+            monthly_stats = {
+                metric: monthly_mean_std(month_codes, month_counts, df_anomalies[metric].to_numpy(dtype=np.float64))
+                for metric in NOTEBOOK_METRICS
+            }
             
-            # Merge monthly averages back to main dataframe
-            df_anomalies = pd.merge(df, monthly_averages, on='month', how='left')
+            # Monthly historical averages, aligned to each row
+            for metric in NOTEBOOK_METRICS:
+                df_anomalies[f'{metric}_monthly_avg_historical'] = monthly_stats[metric][0]
             
             # Calculate anomalies as current_value - monthly_historical_average
-            df_anomalies['pr_anomaly'] = df_anomalies['pr'] - df_anomalies['pr_monthly_avg_historical']
-            df_anomalies['tasmax_anomaly'] = df_anomalies['tasmax'] - df_anomalies['tasmax_monthly_avg_historical']
-            df_anomalies['tasmin_anomaly'] = df_anomalies['tasmin'] - df_anomalies['tasmin_monthly_avg_historical']
-            
-            # Calculate standard deviation of anomalies for each month
-            anomaly_std = df_anomalies.groupby('month').agg({
-                'pr_anomaly': 'std',
-                'tasmax_anomaly': 'std', 
-                'tasmin_anomaly': 'std'
-            }).reset_index()
+            for metric in NOTEBOOK_METRICS:
+                df_anomalies[f'{metric}_anomaly'] = df_anomalies[metric] - df_anomalies[f'{metric}_monthly_avg_historical']
             
-            # Rename columns to match notebook
-            anomaly_std.rename(columns={
-                'pr_anomaly': 'pr_anomaly_std',
-                'tasmax_anomaly': 'tasmax_anomaly_std',
-                'tasmin_anomaly': 'tasmin_anomaly_std'
-            }, inplace=True)
-            
-            # Merge anomaly standard deviations back
-            df_anomalies = pd.merge(df_anomalies, anomaly_std, on='month', how='left')
+            # Standard deviation of anomalies for each month, aligned to each row
+            for metric in NOTEBOOK_METRICS:
+                df_anomalies[f'{metric}_anomaly_std'] = monthly_stats[metric][1]
             
             # Calculate z-scores as anomaly / anomaly_std (exactly as in notebook)
             df_anomalies['pr_anomaly_zscore'] = df_anomalies['pr_anomaly'] / df_anomalies['pr_anomaly_std']
@@ -158,83 +246,68 @@ class AnomalyDetector:
             print(f"❌ Error calculating anomalies with z-scores: {e}")
             return pd.DataFrame()
     
-    def get_notebook_style_anomalies(self, location: str = "default") -> List[Anomaly]:
+    def get_notebook_style_anomalies(self, location: str = "default",
+                                     df_anomalies: Optional[pd.DataFrame] = None) -> List[Anomaly]:
         """
-        Generate anomalies using the exact methodology from the notebook
+        Generate anomalies using the exact methodology from the notebook.
+        Pass a precomputed df_anomalies to skip recalculating it.
         """
         try:
-            # Get weather data as DataFrame
-            df = self.get_weather_dataframe(location)
-            if df.empty:
-                print("❌ No weather data available")
-                return []
+            if df_anomalies is None:
+                # Get weather data as DataFrame
+                df = self.get_weather_dataframe(location)
+                if df.empty:
+                    print("❌ No weather data available")
+                    return []
+                
+                # Calculate anomalies and z-scores using notebook methodology
+                df_anomalies = self.calculate_anomalies_with_zscores(df)
             
-            # Calculate anomalies and z-scores using notebook methodology
-            df_anomalies = self.calculate_anomalies_with_zscores(df)
             if df_anomalies.empty:
                 print("❌ Failed to calculate anomalies")
                 return []
             
             anomalies = []
             
-            # Convert to Anomaly objects
-            for _, row in df_anomalies.iterrows():
-                # Process precipitation anomalies
-                if row['pr_anomaly_significant'] and not pd.isna(row['pr_anomaly_zscore']):
-                    anomaly = Anomaly(
-                        weather_data_id=str(row['_id']),
-                        anomaly_type=WeatherDataType.PRECIPITATION,
-                        severity=self.determine_severity(row['pr_anomaly_zscore']),
-                        value=float(row['pr']),
-                        expected_value=float(row['pr_monthly_avg_historical']),
-                        deviation=float(row['pr_anomaly']),
-                        z_score=float(row['pr_anomaly_zscore']),
-                        description=f"Precipitation anomaly in {row['year']}-{row['month']:02d}: {row['pr']:.2f}mm (monthly avg: {row['pr_monthly_avg_historical']:.2f}mm, anomaly: {row['pr_anomaly']:.2f}mm, z-score: {row['pr_anomaly_zscore']:.2f})",
-                        location=location,
-                        # Additional notebook-style data
-                        monthly_historical_avg=float(row['pr_monthly_avg_historical']),
-                        monthly_anomaly_std=float(row['pr_anomaly_std']),
-                        is_significant=True
-                    )
-                    anomalies.append(anomaly)
+            # Convert significant rows to Anomaly objects, one metric at a time
+            for metric in NOTEBOOK_METRICS:
+                anomaly_type, describe, metric_type = NOTEBOOK_METRIC_INFO[metric]
+                z_col = df_anomalies[f'{metric}_anomaly_zscore']
+                mask = (df_anomalies[f'{metric}_anomaly_significant'] & z_col.notna()).to_numpy()
+                if not mask.any():
+                    continue
                 
-                # Process maximum temperature anomalies
-                if row['tasmax_anomaly_significant'] and not pd.isna(row['tasmax_anomaly_zscore']):
-                    anomaly = Anomaly(
-                        weather_data_id=str(row['_id']),
-                        anomaly_type=WeatherDataType.TEMPERATURE,
-                        severity=self.determine_severity(row['tasmax_anomaly_zscore']),
-                        value=float(row['tasmax']),
-                        expected_value=float(row['tasmax_monthly_avg_historical']),
-                        deviation=float(row['tasmax_anomaly']),
-                        z_score=float(row['tasmax_anomaly_zscore']),
-                        description=f"Maximum temperature anomaly in {row['year']}-{row['month']:02d}: {row['tasmax']:.2f}°C (monthly avg: {row['tasmax_monthly_avg_historical']:.2f}°C, anomaly: {row['tasmax_anomaly']:.2f}°C, z-score: {row['tasmax_anomaly_zscore']:.2f})",
-                        location=location,
-                        # Additional notebook-style data
-                        monthly_historical_avg=float(row['tasmax_monthly_avg_historical']),
-                        monthly_anomaly_std=float(row['tasmax_anomaly_std']),
-                        is_significant=True,
-                        metric_type='tasmax'
-                    )
-                    anomalies.append(anomaly)
+                significant = df_anomalies.loc[mask]
+                z_scores = significant[f'{metric}_anomaly_zscore'].to_numpy()
+                severities = self.determine_severities(z_scores)
                 
-                # Process minimum temperature anomalies
-                if row['tasmin_anomaly_significant'] and not pd.isna(row['tasmin_anomaly_zscore']):
+                for _id, year, month, value, avg, deviation, z_score, std, severity in zip(
+                    significant['_id'].to_numpy(),
+                    significant['year'].to_numpy(),
+                    significant['month'].to_numpy(),
+                    significant[metric].to_numpy(),
+                    significant[f'{metric}_monthly_avg_historical'].to_numpy(),
+                    significant[f'{metric}_anomaly'].to_numpy(),
+                    z_scores,
+                    significant[f'{metric}_anomaly_std'].to_numpy(),
+                    severities
+                ):
                     anomaly = Anomaly(
-                        weather_data_id=str(row['_id']),
-                        anomaly_type=WeatherDataType.TEMPERATURE,
-                        severity=self.determine_severity(row['tasmin_anomaly_zscore']),
-                        value=float(row['tasmin']),
-                        expected_value=float(row['tasmin_monthly_avg_historical']),
-                        deviation=float(row['tasmin_anomaly']),
-                        z_score=float(row['tasmin_anomaly_zscore']),
-                        description=f"Minimum temperature anomaly in {row['year']}-{row['month']:02d}: {row['tasmin']:.2f}°C (monthly avg: {row['tasmin_monthly_avg_historical']:.2f}°C, anomaly: {row['tasmin_anomaly']:.2f}°C, z-score: {row['tasmin_anomaly_zscore']:.2f})",
+                        weather_data_id=str(_id),
+                        anomaly_type=anomaly_type,
+                        severity=severity,
+                        value=float(value),
+                        expected_value=float(avg),
+                        deviation=float(deviation),
+                        z_score=float(z_score),
+                        description=describe(year=year, month=month, value=value, avg=avg,
+                                             deviation=deviation, z_score=z_score),
                         location=location,
                         # Additional notebook-style data
-                        monthly_historical_avg=float(row['tasmin_monthly_avg_historical']),
-                        monthly_anomaly_std=float(row['tasmin_anomaly_std']),
+                        monthly_historical_avg=float(avg),
+                        monthly_anomaly_std=float(std),
                         is_significant=True,
-                        metric_type='tasmin'
+                        metric_type=metric_type
                     )
                     anomalies.append(anomaly)
             
@@ -247,25 +320,32 @@ class AnomalyDetector:
             traceback.print_exc()
             return []
     
-    def get_anomaly_timeseries_data(self, location: str = "default") -> Dict[str, Any]:
+    def get_anomaly_timeseries_data(self, location: str = "default",
+                                    df_anomalies: Optional[pd.DataFrame] = None) -> Dict[str, Any]:
         """
-        Get anomaly data formatted for time series visualization (matching notebook plots)
+        Get anomaly data formatted for time series visualization (matching notebook plots).
+        Pass a precomputed df_anomalies to skip recalculating it.
         """
         try:
-            # Get weather data as DataFrame
-            df = self.get_weather_dataframe(location)
-            if df.empty:
-                return {}
+            if df_anomalies is None:
+                # Get weather data as DataFrame
+                df = self.get_weather_dataframe(location)
+                if df.empty:
+                    return {}
+                
+                # Calculate anomalies and z-scores
+                df_anomalies = self.calculate_anomalies_with_zscores(df)
             
-            # Calculate anomalies and z-scores
-            df_anomalies = self.calculate_anomalies_with_zscores(df)
             if df_anomalies.empty:
                 return {}
             
+            # Format dates once; every metric shares the same axis
+            dates = df_anomalies['date'].dt.strftime('%Y-%m-%d').tolist()
+            
             # Prepare data for each metric (matching notebook structure)
             timeseries_data = {
                 'precipitation': {
-                    'dates': df_anomalies['date'].dt.strftime('%Y-%m-%d').tolist(),
+                    'dates': dates,
                     'anomalies': df_anomalies['pr_anomaly'].tolist(),
                     'z_scores': df_anomalies['pr_anomaly_zscore'].tolist(),
                     'significant': df_anomalies['pr_anomaly_significant'].tolist(),
@@ -273,7 +353,7 @@ class AnomalyDetector:
                     'historical_avg': df_anomalies['pr_monthly_avg_historical'].tolist()
                 },
                 'max_temperature': {
-                    'dates': df_anomalies['date'].dt.strftime('%Y-%m-%d').tolist(),
+                    'dates': dates,
                     'anomalies': df_anomalies['tasmax_anomaly'].tolist(),
                     'z_scores': df_anomalies['tasmax_anomaly_zscore'].tolist(),
                     'significant': df_anomalies['tasmax_anomaly_significant'].tolist(),
@@ -281,7 +361,7 @@ class AnomalyDetector:
                     'historical_avg': df_anomalies['tasmax_monthly_avg_historical'].tolist()
                 },
                 'min_temperature': {
-                    'dates': df_anomalies['date'].dt.strftime('%Y-%m-%d').tolist(),
+                    'dates': dates,
                     'anomalies': df_anomalies['tasmin_anomaly'].tolist(),
                     'z_scores': df_anomalies['tasmin_anomaly_zscore'].tolist(),
                     'significant': df_anomalies['tasmin_anomaly_significant'].tolist(),
@@ -296,93 +376,60 @@ class AnomalyDetector:
             print(f"❌ Error getting anomaly timeseries data: {e}")
             return {}
     
+    def invalidate_cache(self, location: Optional[str] = None):
+        """
+        Drop a location's cached weather arrays, or every location's when none is given.
+        """
+        if location is None:
+            self._weather_arrays_cache.clear()
+        else:
+            self._weather_arrays_cache.pop(location)
+    
     def detect_extreme_events(self, location: str = "default") -> List[Anomaly]:
         """
         Detect extreme weather events (record highs/lows) with monthly context
         """
         try:
-            weather_data = list(self.weather_collection.find({"location": location}).sort("year", 1))
-            
-            if not weather_data:
+            df = self.get_weather_dataframe(location)
+            if df.empty:
                 return []
             
+            by_month = df.groupby('month', sort=False)
+            month_counts = by_month.size()
+            months = month_counts.index[month_counts >= 10]  # Need sufficient data
+            
+            ids = df['_id'].to_numpy()
+            years = df['year'].to_numpy()
             anomalies = []
             
-            # Group by month to find monthly records
-            monthly_records = {}
-            for record in weather_data:
-                month = record.get('month', 1)
-                if month not in monthly_records:
-                    monthly_records[month] = []
-                monthly_records[month].append(record)
-            
-            # Find records for each month
-            for month, records in monthly_records.items():
-                if len(records) < 10:  # Need sufficient data
-                    continue
-                
-                max_temps = [r['tasmax_avg'] for r in records]
-                min_temps = [r['tasmin_avg'] for r in records]
-                precips = [r['pr_total'] for r in records]
+            for metric, extreme, anomaly_type, describe in EXTREME_EVENT_SPECS:
+                grouped = by_month[metric]
                 
-                max_temp = max(max_temps)
-                min_temp = min(min_temps)
-                max_precip = max(precips)
+                # Row holding each monthly record, checked against that month's distribution
+                stats = pd.DataFrame({
+                    'record_idx': grouped.idxmax() if extreme == 'max' else grouped.idxmin(),
+                    'mean': grouped.mean(),
+                    'std': grouped.std()
+                }).loc[months]
+                stats['value'] = df[metric].to_numpy()[stats['record_idx'].to_numpy()]
+                stats['z_score'] = (stats['value'] - stats['mean']) / stats['std']
+                stats = stats[stats['z_score'].abs() >= 2.0]  # Only if statistically significant
                 
-                # Find records that are monthly extremes
-                for record in records:
-                    year = record['year']
-                    
-                    # Record high temperature for this month
-                    if record['tasmax_avg'] == max_temp:
-                        z_score = (max_temp - self.calculate_mean(max_temps)) / self.calculate_std(max_temps)
-                        if abs(z_score) >= 2.0:  # Only if statistically significant
-                            anomaly = Anomaly(
-                                weather_data_id=str(record["_id"]),
-                                anomaly_type=WeatherDataType.TEMPERATURE,
-                                severity=AnomalySeverity.EXTREME,
-                                value=float(max_temp),
-                                expected_value=float(self.calculate_mean(max_temps)),
-                                deviation=float(max_temp - self.calculate_mean(max_temps)),
-                                z_score=float(z_score),
-                                description=f"Record high temperature for month {month}: {max_temp:.2f}°C in {year} (z-score: {z_score:.2f})",
-                                location=location
-                            )
-                            anomalies.append(anomaly)
-                    
-                    # Record low temperature for this month
-                    if record['tasmin_avg'] == min_temp:
-                        z_score = (min_temp - self.calculate_mean(min_temps)) / self.calculate_std(min_temps)
-                        if abs(z_score) >= 2.0:  # Only if statistically significant
-                            anomaly = Anomaly(
-                                weather_data_id=str(record["_id"]),
-                                anomaly_type=WeatherDataType.TEMPERATURE,
-                                severity=AnomalySeverity.EXTREME,
-                                value=float(min_temp),
-                                expected_value=float(self.calculate_mean(min_temps)),
-                                deviation=float(min_temp - self.calculate_mean(min_temps)),
-                                z_score=float(z_score),
-                                description=f"Record low temperature for month {month}: {min_temp:.2f}°C in {year} (z-score: {z_score:.2f})",
-                                location=location
-                            )
-                            anomalies.append(anomaly)
-                    
-                    # Record high precipitation for this month
-                    if record['pr_total'] == max_precip:
-                        z_score = (max_precip - self.calculate_mean(precips)) / self.calculate_std(precips)
-                        if abs(z_score) >= 2.0:  # Only if statistically significant
-                            anomaly = Anomaly(
-                                weather_data_id=str(record["_id"]),
-                                anomaly_type=WeatherDataType.PRECIPITATION,
-                                severity=AnomalySeverity.EXTREME,
-                                value=float(max_precip),
-                                expected_value=float(self.calculate_mean(precips)),
-                                deviation=float(max_precip - self.calculate_mean(precips)),
-                                z_score=float(z_score),
-                                description=f"Record high precipitation for month {month}: {max_precip:.2f}mm in {year} (z-score: {z_score:.2f})",
-                                location=location
-                            )
-                            anomalies.append(anomaly)
+                for month, record_idx, value, mean, z_score in zip(
+                    stats.index, stats['record_idx'], stats['value'], stats['mean'], stats['z_score']
+                ):
+                    anomaly = Anomaly(
+                        weather_data_id=str(ids[record_idx]),
+                        anomaly_type=anomaly_type,
+                        severity=AnomalySeverity.EXTREME,
+                        value=float(value),
+                        expected_value=float(mean),
+                        deviation=float(value - mean),
+                        z_score=float(z_score),
+                        description=describe(month=month, value=value, year=years[record_idx], z_score=z_score),
+                        location=location
+                    )
+                    anomalies.append(anomaly)
             
             return anomalies
             
@@ -397,58 +444,51 @@ class AnomalyDetector:
         """
         try:
             # Get weather data
-            weather_data = list(self.weather_collection.find({"location": location}).sort("year", 1))
+            arrays = self._load_weather_arrays(location)
+            ids = arrays['_id']
             
-            if len(weather_data) < window_size:
+            if len(ids) < window_size:
                 return []
             
             anomalies = []
             
             # Calculate moving averages for temperature
-            if 'tas_avg' in weather_data[0]:
-                values = [d['tas_avg'] for d in weather_data]
+            if not np.isnan(arrays['tas_avg'][0]):
+                values = arrays['tas_avg']
                 
-                # Calculate moving averages
-                moving_averages = []
-                moving_stds = []
-                
-                for i in range(len(values)):
-                    start = max(0, i - window_size // 2)
-                    end = min(len(values), i + window_size // 2 + 1)
-                    window_data = values[start:end]
-                    
-                    ma = self.calculate_mean(window_data)
-                    ma_std = self.calculate_std(window_data)
-                    
-                    moving_averages.append(ma)
-                    moving_stds.append(ma_std)
+                # Centered rolling window, truncated at the edges like the slice it replaces
+                rolling = pd.Series(values).rolling(2 * (window_size // 2) + 1, center=True, min_periods=1)
+                moving_averages = rolling.mean().to_numpy()
+                moving_stds = rolling.std().to_numpy()
                 
                 # Find points that deviate significantly from moving average
-                for i in range(window_size, len(values) - window_size):
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    z_scores = (values - moving_averages) / moving_stds
+                in_range = np.zeros(len(values), dtype=bool)
+                in_range[window_size:len(values) - window_size] = True
+                
+                # Use proper threshold (≥ 2.0 for significance)
+                indices = np.flatnonzero(in_range & (moving_stds > 0) & (np.abs(z_scores) >= 2.0))
+                severities = self.determine_severities(z_scores[indices])
+                
+                for i, severity in zip(indices, severities):
                     current_temp = values[i]
                     ma_temp = moving_averages[i]
-                    ma_std = moving_stds[i]
+                    z_score = z_scores[i]
+                    
+                    anomaly = Anomaly(
+                        weather_data_id=str(ids[i]),
+                        anomaly_type=WeatherDataType.TEMPERATURE,
+                        severity=severity,
+                        value=float(current_temp),
+                        expected_value=float(ma_temp),
+                        deviation=float(current_temp - ma_temp),
+                        z_score=float(z_score),
+                        description=f"Moving average anomaly: {current_temp:.2f} vs {ma_temp:.2f} (z-score: {z_score:.2f})",
+                        location=location
+                    )
                     
-                    if ma_std > 0:
-                        z_score = (current_temp - ma_temp) / ma_std
-                        
-                        # Use proper threshold (≥ 2.0 for significance)
-                        if abs(z_score) >= 2.0:
-                            severity = self.determine_severity(z_score)
-                            
-                            anomaly = Anomaly(
-                                weather_data_id=str(weather_data[i]["_id"]),
-                                anomaly_type=WeatherDataType.TEMPERATURE,
-                                severity=severity,
-                                value=float(current_temp),
-                                expected_value=float(ma_temp),
-                                deviation=float(current_temp - ma_temp),
-                                z_score=float(z_score),
-                                description=f"Moving average anomaly: {current_temp:.2f} vs {ma_temp:.2f} (z-score: {z_score:.2f})",
-                                location=location
-                            )
-                            
-                            anomalies.append(anomaly)
+                    anomalies.append(anomaly)
             
             return anomalies
             
@@ -464,30 +504,33 @@ class AnomalyDetector:
             if not anomalies:
                 return {"success": True, "message": "No anomalies to save", "saved_count": 0}
             
-            # Convert to dict for MongoDB insertion
-            anomaly_dicts = [anomaly.dict() for anomaly in anomalies]
+            # Upsert on (weather_data_id, anomaly_type, location); the unique index
+            # makes the server drop duplicates, keeping the first one written
+            operations = []
+            for anomaly in anomalies:
+                anomaly_dict = anomaly.model_dump()
+                key = {
+                    "weather_data_id": anomaly_dict['weather_data_id'],
+                    "anomaly_type": anomaly_dict['anomaly_type'],
+                    "location": anomaly_dict['location']
+                }
+                operations.append(UpdateOne(key, {"$setOnInsert": anomaly_dict}, upsert=True))
             
-            # Remove duplicates based on weather_data_id and anomaly_type
-            unique_anomalies = []
-            seen = set()
+            try:
+                saved_count = self.anomaly_collection.bulk_write(operations, ordered=False).upserted_count
+            except BulkWriteError as e:
+                # Concurrent runs may race on the same key; duplicates are expected
+                if any(error.get('code') != 11000 for error in e.details.get('writeErrors', [])):
+                    raise
+                saved_count = e.details.get('nUpserted', 0)
             
-            for anomaly in anomaly_dicts:
-                key = (anomaly['weather_data_id'], anomaly['anomaly_type'])
-                if key not in seen:
-                    seen.add(key)
-                    unique_anomalies.append(anomaly)
+            print(f"✅ Saved {saved_count} anomalies to database")
             
-            if unique_anomalies:
-                result = self.anomaly_collection.insert_many(unique_anomalies)
-                print(f"✅ Saved {len(result.inserted_ids)} anomalies to database")
-                
-                return {
-                    "success": True,
-                    "message": f"Successfully saved {len(result.inserted_ids)} anomalies",
-                    "saved_count": len(result.inserted_ids)
-                }
-            else:
-                return {"success": True, "message": "No new anomalies to save", "saved_count": 0}
+            return {
+                "success": True,
+                "message": f"Successfully saved {saved_count} anomalies",
+                "saved_count": saved_count
+            }
                 
         except Exception as e:
             print(f"❌ Error saving anomalies: {e}")
@@ -548,8 +591,12 @@ class AnomalyDetector:
             self.anomaly_collection.delete_many({"location": location})
             print("🗑️ Cleared old anomalies")
             
+            # Compute the anomaly frame once; detection and timeseries both reuse it
+            df = self.get_weather_dataframe(location)
+            df_anomalies = self.calculate_anomalies_with_zscores(df) if not df.empty else None
+            
             # Run notebook-style anomaly detection (primary method)
-            notebook_anomalies = self.get_notebook_style_anomalies(location)
+            notebook_anomalies = self.get_notebook_style_anomalies(location, df_anomalies)
             
             # Optional: Include extreme events as well for completeness
             extreme_events = self.detect_extreme_events(location)
@@ -565,7 +612,7 @@ class AnomalyDetector:
             save_result = self.save_anomalies(all_anomalies)
             
             # Get timeseries data for visualization
-            timeseries_data = self.get_anomaly_timeseries_data(location)
+            timeseries_data = self.get_anomaly_timeseries_data(location, df_anomalies)
             
             return {
                 "success": True,
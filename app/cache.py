@@ -0,0 +1,129 @@
+import os
+import sqlite3
+import hashlib
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+PROMPT_CACHE_PATH = os.getenv("PROMPT_CACHE_PATH", "prompt_cache.sqlite3")
+PROMPT_CACHE_MAX_ENTRIES = int(os.getenv("PROMPT_CACHE_MAX_ENTRIES", "10000"))
+DATA_CACHE_TTL = float(os.getenv("DATA_CACHE_TTL", "60"))
+
+class PromptCache:
+    """
+    SQLite-backed cache of LLM responses keyed on the exact prompt text (sha256).
+    Least recently used entries are evicted beyond max_entries.
+    """
+    def __init__(self, path: str = PROMPT_CACHE_PATH, max_entries: int = PROMPT_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        try:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "prompt_hash TEXT PRIMARY KEY, response TEXT NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_used ON responses (last_used)")
+            self._conn.commit()
+        except sqlite3.Error as e:
+            print(f"⚠️  Prompt cache disabled: {e}")
+            self._conn = None
+
+    @staticmethod
+    def _key(prompt: str) -> str:
+        return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+    def get(self, prompt: str) -> Optional[str]:
+        """Return the cached response for a prompt, or None"""
+        if self._conn is None:
+            return None
+        key = self._key(prompt)
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT response FROM responses WHERE prompt_hash = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    return None
+                self._conn.execute(
+                    "UPDATE responses SET last_used = ? WHERE prompt_hash = ?", (time.time(), key)
+                )
+                self._conn.commit()
+                return row[0]
+        except sqlite3.Error as e:
+            print(f"⚠️  Prompt cache read failed: {e}")
+            return None
+
+    def set(self, prompt: str, response: str):
+        """Store a response, evicting the least recently used entries past max_entries"""
+        if self._conn is None:
+            return
+        try:
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO responses (prompt_hash, response, last_used) VALUES (?, ?, ?)",
+                    (self._key(prompt), response, time.time())
+                )
+                excess = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0] - self.max_entries
+                if excess > 0:
+                    self._conn.execute(
+                        "DELETE FROM responses WHERE prompt_hash IN "
+                        "(SELECT prompt_hash FROM responses ORDER BY last_used LIMIT ?)", (excess,)
+                    )
+                self._conn.commit()
+        except sqlite3.Error as e:
+            print(f"⚠️  Prompt cache write failed: {e}")
+
+    def get_or_compute(self, prompt: str, compute: Callable[[], str]) -> str:
+        """Return the cached response for a prompt, calling compute() and caching on a miss"""
+        response = self.get(prompt)
+        if response is None:
+            response = compute()
+            self.set(prompt, response)
+        return response
+
+class TTLCache:
+    """
+    In-process cache of query results that expire ttl seconds after being stored.
+    The oldest entry is dropped beyond maxsize.
+    """
+    def __init__(self, ttl: float = DATA_CACHE_TTL, maxsize: int = 128):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries: Dict[Hashable, Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value for a key, or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return None
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any):
+        """Store a value for ttl seconds"""
+        with self._lock:
+            self._entries.pop(key, None)
+            if len(self._entries) >= self.maxsize:
+                del self._entries[next(iter(self._entries))]
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+
+    def pop(self, key: Hashable):
+        """Drop one entry if present"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Drop every entry, e.g. after the underlying data changes"""
+        with self._lock:
+            self._entries.clear()
+
+# Global instance
+prompt_cache = PromptCache()
\ No newline at end of file
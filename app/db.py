@@ -8,6 +8,17 @@ from dotenv import load_dotenv
 # Load environment variables from .env file
 load_dotenv()
 
+# Connection pool sizing (tune per environment)
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL", "200"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL", "10"))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000"))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "2000"))
+MONGO_RETRY_WRITES = os.getenv("MONGO_RETRY_WRITES", "true").lower() == "true"
+
+# Wire compression, in order of preference ("zstd" needs the zstandard package, "snappy" python-snappy);
+# set to an empty string to disable
+MONGO_COMPRESSORS = os.getenv("MONGO_COMPRESSORS", "zlib")
+
 class Database:
     def __init__(self):
         self.client: Optional[MongoClient] = None
@@ -31,8 +42,12 @@ class Database:
                 serverSelectionTimeoutMS=5000,  # Shorter timeout for startup
                 connectTimeoutMS=5000,
                 socketTimeoutMS=5000,
-                maxPoolSize=10,
-                retryWrites=True
+                maxPoolSize=MONGO_MAX_POOL_SIZE,
+                minPoolSize=MONGO_MIN_POOL_SIZE,
+                maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+                waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+                retryWrites=MONGO_RETRY_WRITES,
+                **({"compressors": MONGO_COMPRESSORS} if MONGO_COMPRESSORS else {})
             )
             
             # Test connection with shorter timeout
@@ -94,7 +109,7 @@ class MockCollection:
     def find_one(self, *args, **kwargs):
         return None
     
-    def insert_many(self, documents):
+    def insert_many(self, documents, **kwargs):
         print(f"🔧 Mock insert_many: {len(documents)} documents to {self.name}")
         return MockInsertResult(len(documents))
     
@@ -108,6 +123,22 @@ class MockCollection:
     
     def count_documents(self, *args, **kwargs):
         return 0
+    
+    def estimated_document_count(self, *args, **kwargs):
+        return 0
+    
+    def with_options(self, **kwargs):
+        return self
+    
+    def bulk_write(self, requests, **kwargs):
+        print(f"🔧 Mock bulk_write: {len(requests)} operations to {self.name}")
+        return MockBulkWriteResult(len(requests))
+    
+    def aggregate(self, *args, **kwargs):
+        return MockCursor([])
+    
+    def create_index(self, keys, **kwargs):
+        return "_".join(f"{field}_{direction}" for field, direction in keys)
 
 class MockCursor:
     """Mock cursor for find operations"""
@@ -120,6 +151,9 @@ class MockCursor:
     def limit(self, *args, **kwargs):
         return self
     
+    def batch_size(self, *args, **kwargs):
+        return self
+    
     def __iter__(self):
         return iter(self.documents)
     
@@ -131,6 +165,11 @@ class MockInsertResult:
     def __init__(self, count):
         self.inserted_ids = [f"mock_id_{i}" for i in range(count)]
 
+class MockBulkWriteResult:
+    """Mock bulk write result"""
+    def __init__(self, count):
+        self.upserted_count = count
+
 class MockDeleteResult:
     """Mock delete result"""
     def __init__(self, count):
@@ -150,4 +189,28 @@ def get_anomaly_collection():
 
 def get_user_preferences_collection():
     """Get user preferences collection"""
-    return db.get_collection("user_preferences")
\ No newline at end of file
+    return db.get_collection("user_preferences")
+
+def ensure_indexes():
+    """Create the indexes backing the location/year queries, anomaly listing and dedupe (idempotent)"""
+    try:
+        # Serves location equality with year ranges and (year, month) sorts in either direction,
+        # and rejects duplicate months per location on ingest
+        get_weather_collection().create_index([("location", 1), ("year", 1), ("month", 1)], unique=True)
+    except Exception as e:
+        print(f"⚠️  Could not create unique weather index (remove duplicate records or the old non-unique index): {e}")
+    
+    anomaly_collection = get_anomaly_collection()
+    try:
+        anomaly_collection.create_index(
+            [("weather_data_id", 1), ("anomaly_type", 1), ("location", 1)], unique=True
+        )
+    except Exception as e:
+        print(f"⚠️  Could not create unique anomaly index (remove duplicate anomalies first): {e}")
+    
+    try:
+        # Listing filters on location (+ severity) and returns newest first
+        anomaly_collection.create_index([("location", 1), ("severity", 1), ("detected_at", -1)])
+        anomaly_collection.create_index([("location", 1), ("detected_at", -1)])
+    except Exception as e:
+        print(f"⚠️  Could not create database indexes: {e}")
\ No newline at end of file
@@ -1,59 +1,296 @@
 import os
-import google.generativeai as genai
-from typing import Dict, Any, Optional, List
+import re
+import time
+from bisect import bisect_right
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, Any, Optional, List, Tuple, Iterator, Callable
 from dotenv import load_dotenv
-import json
-from pymongo import MongoClient
+import orjson
+from bson.binary import Binary, BinaryVectorDtype, VECTOR_SUBTYPE
+from pymongo import UpdateOne
+from pymongo.errors import OperationFailure
+from pymongo.operations import SearchIndexModel
 import numpy as np
-from sentence_transformers import SentenceTransformer
+
+# Optional SIMD kernels for the local similarity fallback
+try:
+    import simsimd
+    SIMSIMD_AVAILABLE = True
+except ImportError:
+    SIMSIMD_AVAILABLE = False
 
 from .models import Anomaly, ChatMessage, ChatResponse
+from .cache import prompt_cache
+from .db import db
 
 load_dotenv()
 
 # --- VECTOR DB CONFIG ---
-MONGO_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017/")
 VECTOR_DB_NAME = os.getenv("VECTOR_DB_NAME", "cluster0")
 VECTOR_COLLECTION = os.getenv("VECTOR_COLLECTION", "embeddings.vec_embed")
+VECTOR_INDEX_NAME = os.getenv("VECTOR_INDEX_NAME", "vector_index")
+VECTOR_CACHE_TTL = float(os.getenv("VECTOR_CACHE_TTL", "300"))  # seconds
 
 # --- EMBEDDING MODEL ---
 EMBEDDING_MODEL_NAME = "BAAI/bge-m3"
+EMBEDDING_DIMENSIONS = 1024
 _embedding_model = None
+_vector_search_supported = True
+
+# Gemini models in order of preference
+GEMINI_MODEL_NAMES = ('gemini-1.5-flash', 'gemini-1.5-pro', 'gemini-pro')
+
+# Month of a notebook-style anomaly description ("... anomaly in 2015-07: ...")
+DESCRIPTION_MONTH_PATTERN = re.compile(r"anomaly in \d{4}-(\d{2})")
+
+# Pakistan climate seasons; months not listed are Post-Monsoon
+SEASON_BY_MONTH = {
+    12: "Winter", 1: "Winter", 2: "Winter",
+    3: "Spring", 4: "Spring", 5: "Spring",
+    6: "Monsoon", 7: "Monsoon", 8: "Monsoon", 9: "Monsoon"
+}
+
+# |z-score| lower bounds and the rarity described at or above each one
+Z_SCORE_BOUNDS = (1.5, 2.0, 2.5, 3.0)
+Z_SCORE_INTERPRETATIONS = (
+    "Moderately unusual event",
+    "Uncommon event (occurs ~13% of time)",
+    "Rare event (occurs ~5% of time)",
+    "Very rare event (occurs ~1% of time)",
+    "Extremely rare event (occurs ~0.3% of time)"
+)
+
+# Whole-word greetings, so e.g. "history" doesn't count as "hi"
+GREETING_PATTERN = re.compile(
+    r"\b(?:hello|hi|hey|salaam|as-salamu alaykum|good morning|good evening|greetings)\b", re.IGNORECASE
+)
+GREETING_RESPONSE = "Hello! I am your climate scientist assistant. Ask me anything about weather anomalies, climate trends, or specific years/events in Pakistan. I can reference scientific context and real data to help you."
+
+# chunking_type -> (unit-row embedding matrix, chunk docs without embeddings, load time)
+_doc_cache: Dict[str, Tuple[np.ndarray, List[Dict[str, Any]], float]] = {}
+
+def is_greeting(text: str) -> bool:
+    """Short messages (up to three words) containing a greeting count as small talk"""
+    text = text.strip()
+    return len(text.split()) <= 3 and bool(GREETING_PATTERN.search(text))
 
 def get_embedding_model():
     global _embedding_model
     if _embedding_model is None:
+        # Imported lazily: pulls in torch, which is slow to load and rarely needed at startup
+        from sentence_transformers import SentenceTransformer
         _embedding_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+        # Half precision on GPU: half the weight memory traffic per encode, same embeddings to ~1e-3
+        if _embedding_model.device.type == "cuda":
+            _embedding_model.half()
     return _embedding_model
 
+@lru_cache(maxsize=2048)
+def encode_query(query: str) -> np.ndarray:
+    """
+    Encode a search query as a read-only unit vector; cached because chat queries repeat.
+    """
+    embedding = get_embedding_model().encode(query, convert_to_numpy=True, normalize_embeddings=True)
+    # A half-precision model returns float16; searches and stored vectors are float32
+    embedding = embedding.astype(np.float32, copy=False)
+    embedding.setflags(write=False)
+    return embedding
+
 def get_vector_collection():
-    client = MongoClient(MONGO_URI)
-    db = client.get_database(VECTOR_DB_NAME)
-    return db.get_collection(VECTOR_COLLECTION)
+    # Same cluster as the app data, so share the main client's connection pool
+    return db.client.get_database(VECTOR_DB_NAME).get_collection(VECTOR_COLLECTION)
+
+def to_prompt_json(obj: Any) -> str:
+    """
+    Pretty-print an object as JSON for a prompt (handles datetimes and enum keys).
+    """
+    return orjson.dumps(obj, default=str, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode()
+
+def create_vector_search_index():
+    """
+    Create the Atlas vectorSearch index used by search_vector_db (run once per cluster).
+    """
+    collection = get_vector_collection()
+    index_model = SearchIndexModel(
+        definition={
+            "fields": [
+                {"type": "vector", "path": "embedding", "numDimensions": EMBEDDING_DIMENSIONS, "similarity": "cosine"},
+                {"type": "filter", "path": "chunking_type"}
+            ]
+        },
+        name=VECTOR_INDEX_NAME,
+        type="vectorSearch"
+    )
+    return collection.create_search_index(index_model)
+
+def encode_embedding(vec: np.ndarray) -> Binary:
+    """Pack an embedding as a BSON float32 vector (indexable by $vectorSearch)"""
+    # dtype byte + zero padding, then the raw little-endian floats (no per-element Python floats)
+    return Binary(BinaryVectorDtype.FLOAT32.value + b"\x00" + np.asarray(vec, dtype="<f4").tobytes(), VECTOR_SUBTYPE)
+
+def decode_embedding(value) -> np.ndarray:
+    """Read a stored embedding, either a BSON float32 vector or a legacy list of floats"""
+    if isinstance(value, Binary) and value.subtype == VECTOR_SUBTYPE:
+        return np.frombuffer(value, dtype="<f4", offset=2)  # skip the dtype/padding header
+    return np.asarray(value, dtype=np.float32)
+
+def _migrate_embeddings(query: Dict[str, Any], build_update: Callable[[Dict[str, Any]], Optional[Dict[str, Any]]],
+                        batch_size: int) -> int:
+    """Apply build_update(doc) -> $set fields (None to skip) to matching chunks in batched bulk writes"""
+    collection = get_vector_collection()
+    operations = []
+    updated = 0
+    for doc in collection.find(query, {"embedding": 1}):
+        fields = build_update(doc)
+        if fields is None:
+            continue
+        operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": fields}))
+        if len(operations) >= batch_size:
+            updated += collection.bulk_write(operations, ordered=False).modified_count
+            operations = []
+    if operations:
+        updated += collection.bulk_write(operations, ordered=False).modified_count
+    _doc_cache.clear()
+    return updated
+
+def normalize_stored_embeddings(batch_size: int = 500) -> int:
+    """
+    One-off migration: rewrite stored embeddings as unit vectors so cosine similarity is a plain dot product.
+    """
+    def normalize(doc):
+        vec = decode_embedding(doc["embedding"]).astype(np.float64)
+        norm = np.linalg.norm(vec)
+        if norm == 0 or abs(norm - 1.0) < 1e-5:
+            return None
+        return {"embedding": encode_embedding(vec / norm)}
+    
+    updated = _migrate_embeddings({}, normalize, batch_size)
+    print(f"✅ Normalized {updated} stored embeddings")
+    return updated
+
+def convert_stored_embeddings_to_binary(batch_size: int = 500) -> int:
+    """
+    One-off migration: rewrite list-of-floats embeddings as BSON float32 vectors (half the size, one-shot decode).
+    """
+    updated = _migrate_embeddings(
+        {"embedding": {"$type": "array"}},
+        lambda doc: {"embedding": encode_embedding(doc["embedding"])},
+        batch_size
+    )
+    print(f"✅ Converted {updated} stored embeddings to binary vectors")
+    return updated
+
+def quantize_stored_embeddings(batch_size: int = 500) -> int:
+    """
+    One-off migration: add an int8 copy (embedding_i8 + embedding_scale) of each stored embedding.
+    The float embedding is kept for the Atlas vector index.
+    """
+    def quantize(doc):
+        vec = decode_embedding(doc["embedding"])
+        scale = float(np.abs(vec).max())
+        if scale == 0:
+            return None
+        quantized = np.round(vec / scale * 127).astype(np.int8)
+        return {"embedding_i8": Binary(quantized.tobytes()), "embedding_scale": scale}
+    
+    updated = _migrate_embeddings({"embedding_i8": {"$exists": False}}, quantize, batch_size)
+    print(f"✅ Quantized {updated} stored embeddings")
+    return updated
+
+def load_chunk_matrix(collection, chunking_type: str) -> Tuple[np.ndarray, List[Dict[str, Any]]]:
+    """
+    Load a chunking type's embeddings as a float32 matrix of unit rows, cached for VECTOR_CACHE_TTL seconds.
+    """
+    cached = _doc_cache.get(chunking_type)
+    if cached and time.monotonic() - cached[2] < VECTOR_CACHE_TTL:
+        return cached[0], cached[1]
+    
+    # Prefer the int8 copies (4x less to transfer); unquantized chunks still ship floats
+    docs = list(collection.find(
+        {"chunking_type": chunking_type, "embedding_i8": {"$exists": True}},
+        {"_id": 0, "metadata.text": 1, "embedding_i8": 1, "embedding_scale": 1}
+    ))
+    rows = [
+        np.frombuffer(d.pop("embedding_i8"), dtype=np.int8) * np.float32(d.pop("embedding_scale") / 127)
+        for d in docs
+    ]
+    plain_docs = list(collection.find(
+        {"chunking_type": chunking_type, "embedding_i8": {"$exists": False}},
+        {"_id": 0, "metadata.text": 1, "embedding": 1}
+    ))
+    rows += [decode_embedding(d.pop("embedding")) for d in plain_docs]
+    docs += plain_docs
+    
+    if docs:
+        matrix = np.ascontiguousarray(rows, dtype=np.float32)
+    else:
+        matrix = np.empty((0, EMBEDDING_DIMENSIONS), dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix /= np.where(norms == 0, 1, norms)
+    
+    _doc_cache[chunking_type] = (matrix, docs, time.monotonic())
+    return matrix, docs
 
 def search_vector_db(query: str, top_k: int = 5, chunking_type: str = "char") -> List[Dict[str, Any]]:
     """
     Search MongoDB vector collection for top-k most similar chunks to the query.
+    Uses Atlas $vectorSearch, falling back to a local scan where it is unavailable.
+    Atlas returns no documents (rather than an error) when the index does not exist,
+    so an empty $vectorSearch result also falls back. Results carry only metadata.text and score.
     """
-    model = get_embedding_model()
-    query_embedding = model.encode([query])[0]
+    global _vector_search_supported
+    query_embedding = encode_query(query)
     collection = get_vector_collection()
 
-    # Find all docs with the right chunking_type
-    docs = list(collection.find({"chunking_type": chunking_type}))
+    if _vector_search_supported:
+        try:
+            results = list(collection.aggregate([
+                {
+                    "$vectorSearch": {
+                        "index": VECTOR_INDEX_NAME,
+                        "path": "embedding",
+                        "queryVector": encode_embedding(query_embedding),
+                        "numCandidates": top_k * 20,
+                        "limit": top_k,
+                        "filter": {"chunking_type": chunking_type}
+                    }
+                },
+                {"$project": {"_id": 0, "metadata.text": 1, "score": {"$meta": "vectorSearchScore"}}}
+            ]))
+            if results:
+                return results
+            # Missing or still-building index (or no chunks of this type, where the scan is cheap)
+            print(f"⚠️  $vectorSearch on '{VECTOR_INDEX_NAME}' returned nothing, using local similarity search")
+        except OperationFailure as e:
+            # Not an Atlas cluster, or the index has not been created yet
+            print(f"⚠️  $vectorSearch unavailable, using local similarity search: {e}")
+            _vector_search_supported = False
+
+    return search_vector_db_local(query_embedding, collection, top_k, chunking_type)
+
+def search_vector_db_local(query_embedding: np.ndarray, collection, top_k: int = 5,
+                           chunking_type: str = "char") -> List[Dict[str, Any]]:
+    """
+    Brute-force similarity over every chunk (for non-Atlas deployments).
+    Cached rows and the query are unit vectors, so cosine is a dot product.
+    """
+    doc_embeddings, docs = load_chunk_matrix(collection, chunking_type)
     if not docs:
         return []
     
     # Compute cosine similarity
-    doc_embeddings = np.array([d["embedding"] for d in docs])
-    query_vec = np.array(query_embedding)
-    similarities = np.dot(doc_embeddings, query_vec) / (
-        np.linalg.norm(doc_embeddings, axis=1) * np.linalg.norm(query_vec) + 1e-8)
-    top_indices = similarities.argsort()[-top_k:][::-1]
-    top_docs = [docs[i] for i in top_indices]
-    for i, doc in enumerate(top_docs):
-        doc["score"] = float(similarities[top_indices[i]])
-    return top_docs
+    query_vec = np.asarray(query_embedding, dtype=np.float32)
+    if SIMSIMD_AVAILABLE:
+        similarities = 1.0 - np.asarray(simsimd.cdist(query_vec[None, :], doc_embeddings, metric="cosine"))[0]
+    else:
+        similarities = doc_embeddings @ query_vec
+    
+    # Partial selection of the top-k, then sort just those k
+    top_k = min(top_k, len(docs))
+    top_indices = np.argpartition(similarities, -top_k)[-top_k:]
+    top_indices = top_indices[np.argsort(-similarities[top_indices])]
+    return [dict(docs[i], score=float(similarities[i])) for i in top_indices]
 
 class GeminiAI:
     def __init__(self):
@@ -62,25 +299,40 @@ class GeminiAI:
             print("⚠️  GEMINI_API_KEY not found in environment variables")
             self.is_available = False
         else:
+            import google.generativeai as genai
             genai.configure(api_key=self.api_key)
             
-            # Try different model names in order of preference
-            model_names = ['gemini-1.5-flash', 'gemini-1.5-pro', 'gemini-pro']
-            
-            for model_name in model_names:
-                try:
-                    self.model = genai.GenerativeModel(model_name)
-                    # Test the model with a simple prompt
-                    test_response = self.model.generate_content("Hello")
-                    self.is_available = True
-                    print(f"✅ Gemini AI initialized successfully with model: {model_name}")
-                    break
-                except Exception as e:
-                    print(f"⚠️  Model {model_name} not available: {e}")
-                    continue
-            else:
-                print("❌ No Gemini models available")
-                self.is_available = False
+            # No test call here; unavailable models are skipped on first use
+            self._model_index = 0
+            self.model = genai.GenerativeModel(GEMINI_MODEL_NAMES[0])
+            self.is_available = True
+            print(f"✅ Gemini AI configured with model: {GEMINI_MODEL_NAMES[0]}")
+    
+    def generate_content(self, prompt: str, **kwargs):
+        """
+        Call the current model, falling back to the next preferred model if it doesn't exist.
+        The working model is kept for later calls.
+        """
+        import google.generativeai as genai
+        from google.api_core.exceptions import NotFound
+        
+        while True:
+            try:
+                return self.model.generate_content(prompt, **kwargs)
+            except NotFound as e:
+                if self._model_index + 1 >= len(GEMINI_MODEL_NAMES):
+                    print("❌ No Gemini models available")
+                    raise
+                print(f"⚠️  Model {GEMINI_MODEL_NAMES[self._model_index]} not available: {e}")
+                self._model_index += 1
+                self.model = genai.GenerativeModel(GEMINI_MODEL_NAMES[self._model_index])
+                print(f"🔄 Falling back to Gemini model: {GEMINI_MODEL_NAMES[self._model_index]}")
+    
+    def generate_text(self, prompt: str) -> str:
+        """
+        Generate a response for a prompt, reusing the cached answer to an identical prompt
+        """
+        return prompt_cache.get_or_compute(prompt, lambda: self.generate_content(prompt).text)
     
     def generate_anomaly_explanation(self, anomaly: Anomaly, 
                                    historical_context: Optional[Dict[str, Any]] = None) -> str:
@@ -123,7 +375,7 @@ class GeminiAI:
             - Location: {context['location']}
             - Description: {context['description']}
             
-            {f"**Historical Context:** {json.dumps(historical_context, indent=2)}" if historical_context else ""}
+            {f"**Historical Context:** {to_prompt_json(historical_context)}" if historical_context else ""}
             
             Please provide a clear, engaging explanation that:
             1. Explains what this anomaly means in simple terms
@@ -135,8 +387,7 @@ class GeminiAI:
             Keep the explanation under 200 words and make it accessible to non-experts.
             """
             
-            response = self.model.generate_content(prompt)
-            return response.text
+            return self.generate_text(prompt)
             
         except Exception as e:
             print(f"❌ Error generating anomaly explanation: {e}")
@@ -181,7 +432,7 @@ class GeminiAI:
             - Precipitation Trend: {precip_trend:.3f} mm per year
             
             **Recent Data (last 10 years):**
-            {json.dumps(weather_data[-10:], indent=2) if len(weather_data) >= 10 else json.dumps(weather_data, indent=2)}
+            {to_prompt_json(weather_data[-10:]) if len(weather_data) >= 10 else to_prompt_json(weather_data)}
             
             Please provide a climate trend analysis that:
             1. Identifies key patterns in the data
@@ -193,13 +444,51 @@ class GeminiAI:
             Keep the analysis under 300 words and make it accessible to the general public.
             """
             
-            response = self.model.generate_content(prompt)
-            return response.text
+            return self.generate_text(prompt)
             
         except Exception as e:
             print(f"❌ Error generating climate trend analysis: {e}")
             return f"Unable to generate climate analysis: {str(e)}"
     
+    def build_chat_prompt(self, message: ChatMessage) -> Tuple[str, bool]:
+        """
+        Build the RAG chat prompt for a message; also returns whether vector DB context was found
+        """
+        # --- RAG: Retrieve context from vector DB ---
+        rag_context = search_vector_db(message.message, top_k=5)
+        context_texts = [d["metadata"]["text"] for d in rag_context]
+        context_info = "\n\n".join(context_texts)
+        has_context = bool(context_info)
+        if has_context:
+            context_info = f"\n\nRelevant scientific context from documents and data:\n{context_info}"
+
+        # --- System prompt ---
+        prompt = f"""
+        You are a climate scientist and weather anomaly expert for Pakistan. Always answer as a scientist, referencing real data and context if available.
+
+        If the user asks a general greeting (hello, hi, etc.), respond briefly and invite them to ask about anomalies, climate, or specific years/events.
+
+        If context is provided, analyze and reference:
+        - The years, locations, and types of anomalies mentioned
+        - Any significant climate trends or events
+        - How the context relates to the user's question
+        - Use scientific language, but keep it clear and accessible
+        - If possible, cite years, anomaly types, and statistics from the context
+
+        If no context is available, answer using your general climate science knowledge, but state that you are answering without direct document context.
+
+        {context_info}
+
+        User Question: {message.message}
+
+        Your answer should be:
+        - Concise (under 250 words)
+        - Referencing context and data if available
+        - Written as a climate scientist (not a generic chatbot)
+        - If the question is a greeting, do NOT provide a climate analysis, just greet and offer help.
+        """
+        return prompt, has_context
+    
     def chat_with_weather_data(self, message: ChatMessage) -> ChatResponse:
         """
         Chat interface for users to ask questions about weather data, using RAG if possible
@@ -211,50 +500,12 @@ class GeminiAI:
             )
         try:
             # --- Greeting/small talk detection ---
-            greetings = ["hello", "hi", "hey", "salaam", "as-salamu alaykum", "good morning", "good evening", "greetings"]
-            user_msg = message.message.strip().lower()
-            if any(greet in user_msg for greet in greetings) and len(user_msg.split()) <= 3:
-                return ChatResponse(
-                    response="Hello! I am your climate scientist assistant. Ask me anything about weather anomalies, climate trends, or specific years/events in Pakistan. I can reference scientific context and real data to help you.",
-                    confidence=1.0
-                )
-
-            # --- RAG: Retrieve context from vector DB ---
-            rag_context = search_vector_db(message.message, top_k=5)
-            context_texts = [d["metadata"]["text"] for d in rag_context]
-            context_info = "\n\n".join(context_texts)
-            has_context = bool(context_info)
-            if has_context:
-                context_info = f"\n\nRelevant scientific context from documents and data:\n{context_info}"
-
-            # --- System prompt ---
-            prompt = f"""
-            You are a climate scientist and weather anomaly expert for Pakistan. Always answer as a scientist, referencing real data and context if available.
-
-            If the user asks a general greeting (hello, hi, etc.), respond briefly and invite them to ask about anomalies, climate, or specific years/events.
-
-            If context is provided, analyze and reference:
-            - The years, locations, and types of anomalies mentioned
-            - Any significant climate trends or events
-            - How the context relates to the user's question
-            - Use scientific language, but keep it clear and accessible
-            - If possible, cite years, anomaly types, and statistics from the context
-
-            If no context is available, answer using your general climate science knowledge, but state that you are answering without direct document context.
+            if is_greeting(message.message):
+                return ChatResponse(response=GREETING_RESPONSE, confidence=1.0)
 
-            {context_info}
-
-            User Question: {message.message}
-
-            Your answer should be:
-            - Concise (under 250 words)
-            - Referencing context and data if available
-            - Written as a climate scientist (not a generic chatbot)
-            - If the question is a greeting, do NOT provide a climate analysis, just greet and offer help.
-            """
-            response = self.model.generate_content(prompt)
+            prompt, has_context = self.build_chat_prompt(message)
             return ChatResponse(
-                response=response.text,
+                response=self.generate_text(prompt),
                 confidence=0.9 if has_context else 0.7,
                 sources=["Weather anomaly detection system", "RAG context from vector DB"] if has_context else ["Weather anomaly detection system"]
             )
@@ -265,6 +516,33 @@ class GeminiAI:
                 confidence=0.0
             )
     
+    def chat_with_weather_data_stream(self, message: ChatMessage) -> Iterator[str]:
+        """
+        Streaming variant of chat_with_weather_data: yields the answer text as Gemini generates it
+        """
+        if not self.is_available:
+            yield "AI chat not available (Gemini API key not configured)"
+            return
+        try:
+            if is_greeting(message.message):
+                yield GREETING_RESPONSE
+                return
+
+            prompt, _ = self.build_chat_prompt(message)
+            cached = prompt_cache.get(prompt)
+            if cached is not None:
+                yield cached
+                return
+
+            chunks = []
+            for chunk in self.generate_content(prompt, stream=True):
+                chunks.append(chunk.text)
+                yield chunk.text
+            prompt_cache.set(prompt, "".join(chunks))
+        except Exception as e:
+            print(f"❌ Error in streaming chat interface: {e}")
+            yield f"Sorry, I encountered an error: {str(e)}"
+    
     def generate_weather_insights(self, anomalies: List[Anomaly], 
                                 weather_summary: Dict[str, Any]) -> str:
         """
@@ -274,38 +552,17 @@ class GeminiAI:
             return "AI insights not available (Gemini API key not configured)"
         
         try:
-            # Prepare anomaly summary by severity
-            anomaly_summary = {}
-            for anomaly in anomalies:
-                severity = anomaly.severity
-                if severity not in anomaly_summary:
-                    anomaly_summary[severity] = 0
-                anomaly_summary[severity] += 1
-            
-            # Prepare anomaly summary by type
-            anomaly_by_type = {}
-            for anomaly in anomalies:
-                atype = str(anomaly.anomaly_type)
-                if atype not in anomaly_by_type:
-                    anomaly_by_type[atype] = 0
-                anomaly_by_type[atype] += 1
+            # Prepare anomaly summaries by severity and type
+            anomaly_summary = Counter(anomaly.severity for anomaly in anomalies)
+            anomaly_by_type = Counter(str(anomaly.anomaly_type) for anomaly in anomalies)
             
             # Get seasonal distribution of anomalies
-            seasonal_anomalies = {}
+            seasonal_anomalies = Counter()
             for anomaly in anomalies[:10]:  # Use top 10 for seasonal analysis
                 # Extract month from description if available
-                desc = anomaly.description
-                if "anomaly in" in desc and "-" in desc:
-                    try:
-                        month_part = desc.split("anomaly in ")[1].split(":")[0]
-                        if "-" in month_part:
-                            month = int(month_part.split("-")[1])
-                            season = self.get_season_name(month)
-                            if season not in seasonal_anomalies:
-                                seasonal_anomalies[season] = 0
-                            seasonal_anomalies[season] += 1
-                    except:
-                        pass
+                match = DESCRIPTION_MONTH_PATTERN.search(anomaly.description)
+                if match:
+                    seasonal_anomalies[self.get_season_name(int(match.group(1)))] += 1
             
             # Convert anomalies to JSON-serializable format with better context
             serializable_anomalies = []
@@ -351,15 +608,15 @@ class GeminiAI:
             - Z-scores ≥1.5: Medium severity (occurs ~13% of time)
             
             **OVERALL WEATHER PATTERNS:**
-            {json.dumps(weather_summary, indent=2)}
+            {to_prompt_json(weather_summary)}
             
             **ANOMALY DISTRIBUTION:**
-            - By Severity: {json.dumps(anomaly_summary, indent=2)}
-            - By Type: {json.dumps(anomaly_by_type, indent=2)}
-            - By Season: {json.dumps(seasonal_anomalies, indent=2)}
+            - By Severity: {to_prompt_json(anomaly_summary)}
+            - By Type: {to_prompt_json(anomaly_by_type)}
+            - By Season: {to_prompt_json(seasonal_anomalies)}
             
             **SIGNIFICANT ANOMALIES DETECTED:**
-            {json.dumps(serializable_anomalies, indent=2)}
+            {to_prompt_json(serializable_anomalies)}
             
             Please provide expert climate insights that:
             1. Interpret these anomalies in the context of Pakistan's climate patterns
@@ -372,8 +629,7 @@ class GeminiAI:
             Write in an engaging but authoritative tone suitable for policymakers and the public. Keep under 350 words.
             """
             
-            response = self.model.generate_content(prompt)
-            return response.text
+            return self.generate_text(prompt)
             
         except Exception as e:
             print(f"❌ Error generating weather insights: {e}")
@@ -381,32 +637,31 @@ class GeminiAI:
     
     def get_season_name(self, month: int) -> str:
         """Convert month number to season name for Pakistan climate"""
-        if month in [12, 1, 2]:
-            return "Winter"
-        elif month in [3, 4, 5]:
-            return "Spring"
-        elif month in [6, 7, 8, 9]:
-            return "Monsoon"
-        else:
-            return "Post-Monsoon"
+        return SEASON_BY_MONTH.get(month, "Post-Monsoon")
     
     def interpret_z_score(self, z_score: float) -> str:
         """Provide interpretation of z-score statistical significance"""
         abs_z = abs(z_score)
-        if abs_z >= 3.0:
-            return f"Extremely rare event (occurs ~0.3% of time)"
-        elif abs_z >= 2.5:
-            return f"Very rare event (occurs ~1% of time)"
-        elif abs_z >= 2.0:
-            return f"Rare event (occurs ~5% of time)"
-        elif abs_z >= 1.5:
-            return f"Uncommon event (occurs ~13% of time)"
-        else:
-            return f"Moderately unusual event"
+        if abs_z != abs_z:  # NaN compares false against every bound
+            return Z_SCORE_INTERPRETATIONS[0]
+        return Z_SCORE_INTERPRETATIONS[bisect_right(Z_SCORE_BOUNDS, abs_z)]
     
     def is_configured(self) -> bool:
         """Check if Gemini AI is properly configured"""
         return self.is_available
 
-# Global instance
-gemini_ai = GeminiAI()
+# Shared instance, created on first use so importing this module stays cheap
+_gemini_ai = None
+
+def get_gemini_ai() -> GeminiAI:
+    """Return the shared GeminiAI instance, creating it on first use"""
+    global _gemini_ai
+    if _gemini_ai is None:
+        _gemini_ai = GeminiAI()
+    return _gemini_ai
+
+def is_gemini_configured() -> bool:
+    """Check Gemini availability without initializing the client"""
+    if _gemini_ai is None:
+        return bool(os.getenv("GEMINI_API_KEY"))
+    return _gemini_ai.is_configured()
@@ -1,62 +1,167 @@
-import csv
-from typing import List, Dict, Any, Optional
-from datetime import datetime
+from typing import List, Dict, Any, Optional, Iterator
 import requests
+import pandas as pd
+from pymongo import WriteConcern, UpdateOne
+from pymongo.errors import BulkWriteError
 import os
 from dotenv import load_dotenv
 
 from .db import get_weather_collection
 from .models import WeatherData
+from .cache import TTLCache
 
 load_dotenv()
 
+# Records per insert_many call during CSV ingest
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "1000"))
+
+# CSV columns read during ingest
+INGEST_COLUMNS = ['year', 'month', 'pr', 'tasmax', 'tasmin']
+
+# Documents fetched per cursor batch when streaming weather records
+WEATHER_CURSOR_BATCH_SIZE = int(os.getenv("WEATHER_CURSOR_BATCH_SIZE", "1000"))
+
+# Fields returned by the weather record reads (no _id, so records are JSON-ready)
+WEATHER_RECORD_PROJECTION = {
+    "_id": 0, "year": 1, "month": 1, "pr_total": 1,
+    "tasmax_avg": 1, "tasmin_avg": 1, "tas_avg": 1
+}
+
+# Write concern for non-deduplicating CSV ingest (default w=1, acknowledged). Set INGEST_WRITE_CONCERN_W=0
+# to opt in to fire-and-forget writes for large one-off loads (ingest with deduplicate=False): much
+# faster, but insert errors are not reported and the data may not be readable immediately.
+# Deduplicating ingest always uses w=1, since it needs the upsert counts.
+INGEST_WRITE_CONCERN_W = os.getenv("INGEST_WRITE_CONCERN_W", "1")
+
 class DataIngestion:
     def __init__(self):
         self.weather_collection = get_weather_collection()
+        w = int(INGEST_WRITE_CONCERN_W) if INGEST_WRITE_CONCERN_W.isdigit() else INGEST_WRITE_CONCERN_W
+        write_concern = WriteConcern(w=w)
+        self.ingest_acknowledged = write_concern.acknowledged
+        self.ingest_collection = self.weather_collection.with_options(write_concern=write_concern)
+        # Deduplicating ingest needs upsert counts, so it always uses acknowledged writes
+        self.dedupe_collection = (
+            self.ingest_collection if self.ingest_acknowledged
+            else self.weather_collection.with_options(write_concern=WriteConcern(w=1))
+        )
         self.weather_api_key = os.getenv("WEATHER_API_KEY")  # For real-time data
+        # Summary and year range results, cleared whenever new data is ingested
+        self.query_cache = TTLCache()
     
-    def ingest_historical_data(self, csv_file_path: str, location: str = "default") -> Dict[str, Any]:
+    def _insert_batch(self, batch: List[Dict[str, Any]], deduplicate: bool = True) -> int:
+        """
+        Write one batch of weather records (unordered) and return the number newly stored.
+        Unacknowledged (w=0) inserts return the number sent, since the server reports nothing.
         """
-        Ingest historical weather data from CSV file (without pandas)
+        try:
+            if not deduplicate:
+                result = self.ingest_collection.insert_many(batch, ordered=False)
+                stored = len(result.inserted_ids)
+            else:
+                # Upsert on (location, year, month) so re-ingesting the same CSV adds nothing
+                operations = [
+                    UpdateOne(
+                        {"location": record["location"], "year": record["year"], "month": record["month"]},
+                        {"$setOnInsert": record},
+                        upsert=True
+                    )
+                    for record in batch
+                ]
+                result = self.dedupe_collection.bulk_write(operations, ordered=False)
+                stored = result.upserted_count
+        except BulkWriteError as e:
+            # The unique index rejects months already stored (or repeated within the batch)
+            if any(error.get('code') != 11000 for error in e.details.get('writeErrors', [])):
+                raise
+            stored = e.details.get('nUpserted', 0) + e.details.get('nInserted', 0)
+        return stored
+    
+    def ingest_historical_data(self, csv_file_path: str, location: str = "default",
+                               deduplicate: bool = True) -> Dict[str, Any]:
+        """
+        Ingest historical weather data from CSV file
         Format: date, pr, tasmax, tasmin, year, month
+        Records already stored for the same (location, year, month) are skipped
+        unless deduplicate is False, which inserts every row as-is (faster).
         """
         try:
-            # Read CSV data using built-in csv module
-            weather_records = []
-            with open(csv_file_path, 'r', encoding='utf-8') as file:
-                csv_reader = csv.DictReader(file)
-                for row in csv_reader:
-                    try:
-                        # Calculate average temperature from max and min
-                        tasmax = float(row['tasmax'])
-                        tasmin = float(row['tasmin'])
-                        tas_avg = (tasmax + tasmin) / 2
-                        
-                        weather_data = WeatherData(
-                            year=int(row['year']),
-                            month=int(row['month']),
-                            tasmax_avg=tasmax,
-                            tasmin_avg=tasmin,
-                            tas_avg=tas_avg,
-                            pr_total=float(row['pr']),
-                            location=location
-                        )
-                        weather_records.append(weather_data.dict())
-                    except (ValueError, KeyError) as e:
-                        print(f"Warning: Skipping invalid row: {e}")
-                        continue
+            header = pd.read_csv(csv_file_path, nrows=0).columns
+            missing = [col for col in INGEST_COLUMNS if col not in header]
+            if missing:
+                return {
+                    "success": False,
+                    "message": f"CSV is missing required columns: {', '.join(missing)}",
+                    "inserted_count": 0
+                }
+            
+            # Parse and validate the CSV columnwise, inserting in fixed-size batches
+            loaded_count = 0
+            inserted_count = 0
+            chunks = pd.read_csv(
+                csv_file_path, usecols=INGEST_COLUMNS, dtype=str,
+                keep_default_na=False, chunksize=INGEST_BATCH_SIZE
+            )
+            for chunk in chunks:
+                values = chunk.apply(pd.to_numeric, errors='coerce')
+                valid = values.notna().all(axis=1) & (values['year'] % 1 == 0) & (values['month'] % 1 == 0)
+                if not valid.all():
+                    print(f"Warning: Skipping {int((~valid).sum())} invalid rows")
+                values = values[valid]
+                if values.empty:
+                    continue
+                
+                # Calculate average temperature from max and min
+                values['tas_avg'] = (values['tasmax'] + values['tasmin']) / 2
+                
+                # Values are already validated above, so build the WeatherData-shaped documents directly
+                batch = [
+                    {
+                        "year": year,
+                        "month": month,
+                        "day": None,
+                        "tasmax_avg": tasmax,
+                        "tasmin_avg": tasmin,
+                        "tas_avg": tas_avg,
+                        "pr_total": pr,
+                        "location": location
+                    }
+                    for year, month, tasmax, tasmin, tas_avg, pr in zip(
+                        values['year'].astype('int64').tolist(), values['month'].astype('int64').tolist(),
+                        values['tasmax'].tolist(), values['tasmin'].tolist(),
+                        values['tas_avg'].tolist(), values['pr'].tolist()
+                    )
+                ]
+                
+                loaded_count += len(batch)
+                inserted_count += self._insert_batch(batch, deduplicate)
             
-            print(f"📊 Loaded {len(weather_records)} records from {csv_file_path}")
+            print(f"📊 Loaded {loaded_count} records from {csv_file_path}")
             
-            # Insert into MongoDB
-            if weather_records:
-                result = self.weather_collection.insert_many(weather_records)
-                print(f"✅ Successfully ingested {len(result.inserted_ids)} records")
+            if inserted_count and not deduplicate and not self.ingest_acknowledged:
+                self.query_cache.clear()
+                print(f"📤 Sent {inserted_count} records (unacknowledged writes, w=0)")
+                
+                return {
+                    "success": True,
+                    "message": f"Sent {inserted_count} records with unacknowledged writes (w=0); stored count unknown",
+                    "inserted_count": inserted_count
+                }
+            elif inserted_count:
+                self.query_cache.clear()
+                print(f"✅ Successfully ingested {inserted_count} records")
                 
                 return {
                     "success": True,
-                    "message": f"Successfully ingested {len(result.inserted_ids)} records",
-                    "inserted_count": len(result.inserted_ids)
+                    "message": f"Successfully ingested {inserted_count} records",
+                    "inserted_count": inserted_count
+                }
+            elif loaded_count:
+                print(f"ℹ️ All {loaded_count} records were already stored")
+                return {
+                    "success": True,
+                    "message": f"No new records; all {loaded_count} were already stored",
+                    "inserted_count": 0
                 }
             else:
                 return {
@@ -77,20 +182,15 @@ class DataIngestion:
         """
         Get summary statistics of stored weather data (without pandas)
         """
+        summary = self.query_cache.get(("summary",))
+        if summary is not None:
+            return summary
         try:
-            total_records = self.weather_collection.count_documents({})
-            
-            if total_records == 0:
-                return {
-                    "total_records": 0,
-                    "date_range": None,
-                    "locations": []
-                }
-            
-            # Get date range using MongoDB aggregation
+            # Count and statistics in a single aggregation round trip
             pipeline = [
                 {"$group": {
                     "_id": None,
+                    "count": {"$sum": 1},
                     "min_year": {"$min": "$year"},
                     "max_year": {"$max": "$year"},
                     "avg_temp": {"$avg": "$tas_avg"},
@@ -99,10 +199,16 @@ class DataIngestion:
             ]
             
             result = list(self.weather_collection.aggregate(pipeline))
-            if result:
+            if not result or not result[0]["count"]:
+                summary = {
+                    "total_records": 0,
+                    "date_range": None,
+                    "locations": []
+                }
+            else:
                 stats = result[0]
-                return {
-                    "total_records": total_records,
+                summary = {
+                    "total_records": stats["count"],
                     "date_range": {
                         "start_year": stats["min_year"],
                         "end_year": stats["max_year"]
@@ -111,7 +217,8 @@ class DataIngestion:
                     "avg_precipitation": round(stats["avg_precip"], 2)
                 }
             
-            return {"total_records": total_records}
+            self.query_cache.set(("summary",), summary)
+            return summary
             
         except Exception as e:
             print(f"❌ Error getting weather summary: {e}")
@@ -138,31 +245,64 @@ class DataIngestion:
         """
         Get weather data for a specific year range
         """
+        key = ("year_range", start_year, end_year, location)
+        records = self.query_cache.get(key)
+        if records is None:
+            try:
+                query = {
+                    "year": {"$gte": start_year, "$lte": end_year},
+                    "location": location
+                }
+                
+                cursor = self.weather_collection.find(query, WEATHER_RECORD_PROJECTION).sort([("year", 1), ("month", 1)])
+                records = list(cursor)
+            except Exception as e:
+                print(f"❌ Error fetching weather data: {e}")
+                return []
+            self.query_cache.set(key, records)
+        
+        # Callers may modify the records, so hand out copies of the cached ones
+        return [dict(record) for record in records]
+    
+    def iter_weather_by_year_range(self, start_year: int, end_year: int, location: str = "default") -> Iterator[Dict[str, Any]]:
+        """
+        Stream weather data for a specific year range straight from the cursor (uncached)
+        """
+        query = {
+            "year": {"$gte": start_year, "$lte": end_year},
+            "location": location
+        }
+        cursor = self.weather_collection.find(query, WEATHER_RECORD_PROJECTION).sort([("year", 1), ("month", 1)])
+        return cursor.batch_size(WEATHER_CURSOR_BATCH_SIZE)
+    
+    def get_latest_weather_data(self, limit: int = 10, location: str = "default", end_year: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Get the most recent weather data (newest first), optionally up to end_year
+        """
         try:
-            query = {
-                "year": {"$gte": start_year, "$lte": end_year},
-                "location": location
-            }
-            
-            cursor = self.weather_collection.find(query).sort("year", 1)
+            query = {"location": location}
+            if end_year is not None:
+                query["year"] = {"$lte": end_year}
+            cursor = self.weather_collection.find(query, WEATHER_RECORD_PROJECTION).sort([("year", -1), ("month", -1)]).limit(limit)
             return list(cursor)
             
         except Exception as e:
-            print(f"❌ Error fetching weather data: {e}")
+            print(f"❌ Error fetching latest weather data: {e}")
             return []
     
-    def get_latest_weather_data(self, limit: int = 10, location: str = "default") -> List[Dict[str, Any]]:
+    def count_weather_by_year_range(self, start_year: int, end_year: int, location: str = "default") -> int:
         """
-        Get the most recent weather data
+        Count weather records in a specific year range
         """
         try:
-            query = {"location": location}
-            cursor = self.weather_collection.find(query).sort("year", -1).limit(limit)
-            return list(cursor)
+            return self.weather_collection.count_documents({
+                "year": {"$gte": start_year, "$lte": end_year},
+                "location": location
+            })
             
         except Exception as e:
-            print(f"❌ Error fetching latest weather data: {e}")
-            return []
+            print(f"❌ Error counting weather data: {e}")
+            return 0
 
 # Global instance
 data_ingestion = DataIngestion()
@@ -1,23 +1,34 @@
 from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List, Optional, Dict, Any
+from fastapi.responses import StreamingResponse, ORJSONResponse
+from fastapi.concurrency import run_in_threadpool
+from typing import List, Optional, Dict, Any, Iterable, Iterator
+import itertools
+import orjson
+from bson import ObjectId
+import asyncio
+import anyio
 import uvicorn
 import os
 
-from .db import db
+from .db import db, ensure_indexes
 from .models import (
     WeatherData, Anomaly, AnomalyResponse, ChatMessage, ChatResponse,
     WeatherSummary, APIResponse, AnomalySeverity, WeatherDataType
 )
-from .ingest import data_ingestion
+from .ingest import data_ingestion, WEATHER_CURSOR_BATCH_SIZE
 from .anomaly import anomaly_detector
-from .gemini import gemini_ai
+from .gemini import get_gemini_ai, is_gemini_configured
+
+# Worker threads available to run_in_threadpool (blocking pymongo/Gemini calls); AnyIO's default is 40
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", "100"))
 
 # Initialize FastAPI app
 app = FastAPI(
     title="Weather Anomaly Detection Platform",
     description="AI-powered weather anomaly detection with Gemini integration",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # Add CORS middleware
@@ -33,7 +44,9 @@ app.add_middleware(
 async def startup_event():
     """Initialize services on startup"""
     print("🚀 Starting Weather Anomaly Detection Platform...")
-    print(f"🤖 Gemini AI Available: {gemini_ai.is_configured()}")
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+    await run_in_threadpool(ensure_indexes)
+    print(f"🤖 Gemini AI Available: {is_gemini_configured()}")
 
 @app.on_event("shutdown")
 async def shutdown_event():
@@ -41,6 +54,31 @@ async def shutdown_event():
     db.close()
     print("👋 Shutting down Weather Anomaly Detection Platform...")
 
+def stream_records_response(records: Iterable[Dict[str, Any]], message: str) -> Iterator[bytes]:
+    """
+    Encode records as an APIResponse JSON body ({"records": [...], "count": n}), one cursor batch per chunk.
+    The status is already sent once streaming starts, so a cursor error ends the records early
+    and is reported in "error", keeping the body valid JSON.
+    """
+    yield b'{"success":true,"message":' + orjson.dumps(message) + b',"data":{"records":['
+    count = 0
+    chunk = []
+    error = None
+    try:
+        for record in records:
+            chunk.append(orjson.dumps(record))
+            if len(chunk) >= WEATHER_CURSOR_BATCH_SIZE:
+                yield (b',' if count else b'') + b','.join(chunk)
+                count += len(chunk)
+                chunk = []
+    except Exception as e:
+        print(f"❌ Error streaming weather records: {e}")
+        error = f"Error streaming records: {str(e)}"
+    if chunk:
+        yield (b',' if count else b'') + b','.join(chunk)
+        count += len(chunk)
+    yield b'],"count":' + str(count).encode() + b'},"error":' + orjson.dumps(error) + b'}'
+
 # Health check endpoint
 @app.get("/")
 async def root():
@@ -55,13 +93,13 @@ async def health_check():
     """Health check endpoint"""
     try:
         # Test database connection
-        db.client.admin.command('ping')
+        await run_in_threadpool(db.client.admin.command, 'ping')
         return APIResponse(
             success=True,
             message="Service is healthy",
             data={
                 "database": "connected",
-                "gemini_ai": gemini_ai.is_configured()
+                "gemini_ai": is_gemini_configured()
             }
         )
     except Exception as e:
@@ -69,8 +107,11 @@ async def health_check():
 
 # Data ingestion endpoints
 @app.post("/ingest/historical")
-async def ingest_historical_data(csv_file_path: str, location: str = "default"):
-    """Ingest historical weather data from CSV file"""
+async def ingest_historical_data(csv_file_path: str, location: str = "default", deduplicate: bool = True):
+    """
+    Ingest historical weather data from CSV file.
+    deduplicate=false skips the upsert check (faster first loads) and honours INGEST_WRITE_CONCERN_W.
+    """
     try:
         # Clean the file path - remove quotes and handle encoding
         csv_file_path = csv_file_path.strip().strip('"').strip("'")
@@ -83,7 +124,9 @@ async def ingest_historical_data(csv_file_path: str, location: str = "default"):
                 data={"inserted_count": 0}
             )
         
-        result = data_ingestion.ingest_historical_data(csv_file_path, location)
+        result = await run_in_threadpool(data_ingestion.ingest_historical_data, csv_file_path, location, deduplicate)
+        if result["success"]:
+            anomaly_detector.invalidate_cache(location)
         return APIResponse(
             success=result["success"],
             message=result["message"],
@@ -96,7 +139,7 @@ async def ingest_historical_data(csv_file_path: str, location: str = "default"):
 async def get_weather_summary():
     """Get summary statistics of weather data"""
     try:
-        summary = data_ingestion.get_weather_data_summary()
+        summary = await run_in_threadpool(data_ingestion.get_weather_data_summary)
         return APIResponse(
             success=True,
             message="Weather data summary retrieved",
@@ -116,11 +159,17 @@ async def get_weather_by_range(
         if start_year > end_year:
             raise HTTPException(status_code=400, detail="Start year must be before end year")
         
-        data = data_ingestion.get_weather_by_year_range(start_year, end_year, location)
-        return APIResponse(
-            success=True,
-            message=f"Weather data for {start_year}-{end_year}",
-            data={"records": data, "count": len(data)}
+        # Records are streamed from the cursor as they arrive rather than built into one list.
+        # The first batch is fetched up front so query errors become a 500 before the 200 is sent.
+        records = data_ingestion.iter_weather_by_year_range(start_year, end_year, location)
+        first = await run_in_threadpool(next, records, None)
+        if first is not None:
+            records = itertools.chain((first,), records)
+        else:
+            records = ()
+        return StreamingResponse(
+            stream_records_response(records, f"Weather data for {start_year}-{end_year}"),
+            media_type="application/json"
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting weather data: {str(e)}")
@@ -130,7 +179,7 @@ async def get_weather_by_range(
 async def detect_anomalies(location: str = "default"):
     """Run full anomaly detection for a location"""
     try:
-        result = anomaly_detector.run_full_anomaly_detection(location)
+        result = await run_in_threadpool(anomaly_detector.run_full_anomaly_detection, location)
         return APIResponse(
             success=result["success"],
             message="Anomaly detection completed",
@@ -147,7 +196,7 @@ async def get_anomalies(
 ):
     """Get detected anomalies"""
     try:
-        anomalies = anomaly_detector.get_anomalies(location, severity, limit)
+        anomalies = await run_in_threadpool(anomaly_detector.get_anomalies, location, severity, limit)
         return APIResponse(
             success=True,
             message=f"Retrieved {len(anomalies)} anomalies",
@@ -160,7 +209,7 @@ async def get_anomalies(
 async def get_anomaly_timeseries(location: str = "default"):
     """Get anomaly timeseries data for visualization (matching notebook plots)"""
     try:
-        timeseries_data = anomaly_detector.get_anomaly_timeseries_data(location)
+        timeseries_data = await run_in_threadpool(anomaly_detector.get_anomaly_timeseries_data, location)
         
         if not timeseries_data:
             return APIResponse(
@@ -180,11 +229,12 @@ async def get_anomaly_timeseries(location: str = "default"):
 @app.get("/anomalies/{anomaly_id}")
 async def get_anomaly_with_explanation(anomaly_id: str):
     """Get a specific anomaly with AI explanation"""
+    if not ObjectId.is_valid(anomaly_id):
+        raise HTTPException(status_code=400, detail=f"Invalid anomaly id: {anomaly_id}")
+    
     try:
-        from bson import ObjectId
-        
         # Get anomaly from database
-        anomaly_doc = anomaly_detector.anomaly_collection.find_one({"_id": ObjectId(anomaly_id)})
+        anomaly_doc = await run_in_threadpool(anomaly_detector.anomaly_collection.find_one, {"_id": ObjectId(anomaly_id)})
         if not anomaly_doc:
             raise HTTPException(status_code=404, detail="Anomaly not found")
         
@@ -197,29 +247,33 @@ async def get_anomaly_with_explanation(anomaly_id: str):
         # Convert to Anomaly model
         anomaly = Anomaly(**anomaly_doc)
         
-        # Get historical context
-        weather_data = data_ingestion.get_weather_by_year_range(
-            anomaly.detected_at.year - 10, 
-            anomaly.detected_at.year + 1,
-            anomaly.location
+        # Get historical context: only the last 5 records are sent to the model, the rest is just counted
+        start_year, end_year = anomaly.detected_at.year - 10, anomaly.detected_at.year + 1
+        latest_weather, recent_data_count = await asyncio.gather(
+            run_in_threadpool(data_ingestion.get_latest_weather_data, 5, anomaly.location, end_year),
+            run_in_threadpool(data_ingestion.count_weather_by_year_range, start_year, end_year, anomaly.location)
         )
+        recent_weather_data = [record for record in reversed(latest_weather) if record["year"] >= start_year]
         
         # Generate AI explanation
-        ai_explanation = gemini_ai.generate_anomaly_explanation(anomaly, {
-            "recent_weather_data": weather_data[-5:] if weather_data else []
+        gemini_ai = await run_in_threadpool(get_gemini_ai)
+        ai_explanation = await run_in_threadpool(gemini_ai.generate_anomaly_explanation, anomaly, {
+            "recent_weather_data": recent_weather_data
         })
         
         response = AnomalyResponse(
             anomaly=anomaly,
             ai_explanation=ai_explanation,
-            historical_context={"recent_data_count": len(weather_data)}
+            historical_context={"recent_data_count": recent_data_count}
         )
         
         return APIResponse(
             success=True,
             message="Anomaly with AI explanation retrieved",
-            data=response.dict()
+            data=response.model_dump()
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting anomaly: {str(e)}")
 
@@ -228,31 +282,37 @@ async def get_anomaly_with_explanation(anomaly_id: str):
 async def chat_with_ai(message: ChatMessage):
     """Chat with Gemini AI about weather data"""
     try:
-        response = gemini_ai.chat_with_weather_data(message)
+        gemini_ai = await run_in_threadpool(get_gemini_ai)
+        response = await run_in_threadpool(gemini_ai.chat_with_weather_data, message)
         return APIResponse(
             success=True,
             message="AI response generated",
-            data=response.dict()
+            data=response.model_dump()
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error in AI chat: {str(e)}")
 
+@app.post("/ai/chat/stream")
+async def chat_with_ai_stream(message: ChatMessage):
+    """Chat with Gemini AI, streaming the answer as plain text while it is generated"""
+    gemini_ai = await run_in_threadpool(get_gemini_ai)
+    return StreamingResponse(
+        gemini_ai.chat_with_weather_data_stream(message),
+        media_type="text/plain"
+    )
+
 @app.get("/ai/climate-analysis")
 async def get_climate_analysis(location: str = "default"):
     """Get AI-generated climate trend analysis"""
     try:
         # Get recent weather data for analysis
-        weather_data = data_ingestion.get_weather_by_year_range(2014, 2024, location)
+        weather_data = await run_in_threadpool(data_ingestion.get_weather_by_year_range, 2014, 2024, location)
         
         if not weather_data:
             raise HTTPException(status_code=404, detail="No weather data available for analysis")
         
-        # Convert ObjectId to string for JSON serialization
-        for record in weather_data:
-            if '_id' in record:
-                record['_id'] = str(record['_id'])
-        
-        analysis = gemini_ai.generate_climate_trend_analysis(weather_data, location)
+        gemini_ai = await run_in_threadpool(get_gemini_ai)
+        analysis = await run_in_threadpool(gemini_ai.generate_climate_trend_analysis, weather_data, location)
         
         return APIResponse(
             success=True,
@@ -270,28 +330,17 @@ async def get_climate_analysis(location: str = "default"):
 async def get_weather_insights(location: str = "default"):
     """Get AI-generated weather insights"""
     try:
-        # Get recent anomalies
-        anomalies = anomaly_detector.get_anomalies(location, limit=10)
-        
-        # Get weather summary
-        weather_summary = data_ingestion.get_weather_data_summary()
+        # Get recent anomalies and the weather summary concurrently
+        anomalies, weather_summary = await asyncio.gather(
+            run_in_threadpool(anomaly_detector.get_anomalies, location, limit=10),
+            run_in_threadpool(data_ingestion.get_weather_data_summary)
+        )
         
-        # Convert anomalies to Anomaly objects, handling datetime serialization
-        anomaly_objects = []
-        for anomaly in anomalies:
-            try:
-                # Convert datetime string back to datetime object if needed
-                if isinstance(anomaly.get('detected_at'), str):
-                    from datetime import datetime
-                    anomaly['detected_at'] = datetime.fromisoformat(anomaly['detected_at'])
-                
-                anomaly_obj = Anomaly(**anomaly)
-                anomaly_objects.append(anomaly_obj)
-            except Exception as e:
-                print(f"Warning: Skipping anomaly due to serialization issue: {e}")
-                continue
+        # Stored anomalies were validated when saved, so wrap them without re-validating
+        anomaly_objects = [Anomaly.model_construct(**anomaly) for anomaly in anomalies]
         
-        insights = gemini_ai.generate_weather_insights(anomaly_objects, weather_summary)
+        gemini_ai = await run_in_threadpool(get_gemini_ai)
+        insights = await run_in_threadpool(gemini_ai.generate_weather_insights, anomaly_objects, weather_summary)
         
         return APIResponse(
             success=True,
@@ -310,15 +359,17 @@ async def get_weather_insights(location: str = "default"):
 async def get_dashboard_summary(location: str = "default"):
     """Get comprehensive dashboard summary"""
     try:
-        # Get weather summary
-        weather_summary = data_ingestion.get_weather_data_summary()
-        
-        # Get recent anomalies
-        recent_anomalies = anomaly_detector.get_anomalies(location, limit=5)
+        # Get the weather summary and recent anomalies concurrently
+        weather_summary, recent_anomalies = await asyncio.gather(
+            run_in_threadpool(data_ingestion.get_weather_data_summary),
+            run_in_threadpool(anomaly_detector.get_anomalies, location, limit=5)
+        )
         
         # Get AI insights
-        insights = gemini_ai.generate_weather_insights(
-            [Anomaly(**a) for a in recent_anomalies], 
+        gemini_ai = await run_in_threadpool(get_gemini_ai)
+        insights = await run_in_threadpool(
+            gemini_ai.generate_weather_insights,
+            [Anomaly.model_construct(**a) for a in recent_anomalies],
             weather_summary
         )
         
@@ -329,7 +380,7 @@ async def get_dashboard_summary(location: str = "default"):
                 "weather_summary": weather_summary,
                 "recent_anomalies": recent_anomalies,
                 "ai_insights": insights,
-                "gemini_available": gemini_ai.is_configured()
+                "gemini_available": is_gemini_configured()
             }
         )
     except Exception as e:
@@ -344,7 +395,7 @@ async def get_config_status():
         message="Configuration status retrieved",
         data={
             "database": "connected" if db.client else "disconnected",
-            "gemini_ai": gemini_ai.is_configured(),
+            "gemini_ai": is_gemini_configured(),
             "weather_api": bool(data_ingestion.weather_api_key)
         }
     )
@@ -353,24 +404,31 @@ async def get_config_status():
 async def debug_anomaly_severities():
     """Debug endpoint to see what severity values are actually in the database"""
     try:
-        # Get all unique severity values
+        # Severity counts, a few sample anomaly records and the total in one round trip
         pipeline = [
-            {"$group": {"_id": "$severity", "count": {"$sum": 1}}},
-            {"$sort": {"count": -1}}
+            {"$facet": {
+                "severity_counts": [
+                    {"$group": {"_id": "$severity", "count": {"$sum": 1}}},
+                    {"$sort": {"count": -1}}
+                ],
+                "sample_anomalies": [{"$limit": 5}],
+                "total": [{"$count": "n"}]
+            }}
         ]
         
-        severities = list(anomaly_detector.anomaly_collection.aggregate(pipeline))
-        
-        # Also get a few sample anomaly records
-        sample_anomalies = list(anomaly_detector.anomaly_collection.find({}).limit(5))
+        result = await run_in_threadpool(
+            lambda: list(anomaly_detector.anomaly_collection.aggregate(pipeline))
+        )
+        facets = result[0] if result else {}
+        total = facets.get("total") or [{"n": 0}]
         
         return APIResponse(
             success=True,
             message="Debug info retrieved",
             data={
-                "severity_counts": severities,
-                "sample_anomalies": sample_anomalies,
-                "total_anomalies": anomaly_detector.anomaly_collection.count_documents({})
+                "severity_counts": facets.get("severity_counts", []),
+                "sample_anomalies": facets.get("sample_anomalies", []),
+                "total_anomalies": total[0]["n"]
             }
         )
     except Exception as e:
@@ -381,10 +439,10 @@ async def debug_simple():
     """Simple debug endpoint to check basic database connectivity"""
     try:
         # Check if anomaly collection exists and has documents
-        total_count = anomaly_detector.anomaly_collection.count_documents({})
+        total_count = await run_in_threadpool(anomaly_detector.anomaly_collection.estimated_document_count)
         
         # Get one sample document
-        sample = anomaly_detector.anomaly_collection.find_one({})
+        sample = await run_in_threadpool(anomaly_detector.anomaly_collection.find_one, {})
         
         return {
             "total_anomalies": total_count,
@@ -408,13 +466,13 @@ async def debug_raw():
         anomaly_collection = db.get_collection("anomalies")
         
         # Count documents
-        count = anomaly_collection.count_documents({})
+        count = await run_in_threadpool(anomaly_collection.estimated_document_count)
         
         # Get one raw document
-        raw_doc = anomaly_collection.find_one({})
+        raw_doc = await run_in_threadpool(anomaly_collection.find_one, {})
         
         # List all collections in the database
-        collections = db.db.list_collection_names()
+        collections = await run_in_threadpool(db.db.list_collection_names)
         
         return {
             "anomaly_count": count,
@@ -430,4 +488,13 @@ async def debug_raw():
         }
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # Multiple workers (opt-in via UVICORN_WORKERS) need the app as an import string;
+    # "auto" picks uvloop/httptools when installed
+    uvicorn.run(
+        "app.main:app",
+        host="0.0.0.0",
+        port=8000,
+        workers=int(os.getenv("UVICORN_WORKERS", "1")),
+        loop="auto",
+        http="auto"
+    )
\ No newline at end of file
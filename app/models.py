@@ -26,12 +26,7 @@ class WeatherData(BaseModel):
     tas_avg: float     # Average temperature
     pr_total: float    # Total precipitation
     location: Optional[str] = "default"
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
-    
-    class Config:
-        json_encoders = {
-            datetime: lambda v: v.isoformat()
-        }
+    timestamp: Optional[datetime] = None  # Observation time for real-time data; unset for historical monthly records
 
 class Anomaly(BaseModel):
     """Anomaly detection result model"""
@@ -52,11 +47,6 @@ class Anomaly(BaseModel):
     monthly_anomaly_std: Optional[float] = None     # Monthly anomaly standard deviation
     is_significant: Optional[bool] = False          # Whether anomaly is statistically significant (|z_score| >= 2)
     metric_type: Optional[str] = None               # Specific metric (pr, tasmax, tasmin)
-    
-    class Config:
-        json_encoders = {
-            datetime: lambda v: v.isoformat()
-        }
 
 class AnomalyResponse(BaseModel):
     """API response model for anomalies"""
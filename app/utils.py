@@ -1,7 +1,23 @@
-import math
 from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime, timedelta
 import json
+import re
+from bisect import bisect_right
+import numpy as np
+
+# Anything other than (Unicode) letters, digits and underscores, stripped from location names
+LOCATION_STRIP_PATTERN = re.compile(r'\W+')
+
+# Display unit per anomaly type
+ANOMALY_UNITS = {"temperature": "°C", "precipitation": "mm"}
+
+# Severity label for |z| below each bound, and at or above the last one
+SEVERITY_Z_BOUNDS = (1.5, 2.0, 3.0)
+SEVERITY_LABELS = ("low", "medium", "high", "extreme")
+
+def _as_f64(values) -> np.ndarray:
+    """View a sequence of numbers as a float64 array (no copy if it already is one)"""
+    return np.asarray(values, dtype=np.float64)
 
 def calculate_statistics(data: List[float]) -> Dict[str, float]:
     """
@@ -10,19 +26,16 @@ def calculate_statistics(data: List[float]) -> Dict[str, float]:
     if not data:
         return {}
     
-    mean_val = sum(data) / len(data)
-    
-    # Calculate variance and standard deviation
-    variance = sum((x - mean_val) ** 2 for x in data) / len(data)
-    std_val = math.sqrt(variance)
+    arr = _as_f64(data)
     
     return {
-        "mean": float(mean_val),
-        "median": float(sorted(data)[len(data)//2]) if data else 0.0,
-        "std": float(std_val),
-        "min": float(min(data)),
-        "max": float(max(data)),
-        "count": len(data)
+        "mean": float(arr.mean()),
+        # Upper median (element n//2 of the sorted data), selected without a full sort
+        "median": float(np.partition(arr, arr.size // 2)[arr.size // 2]),
+        "std": float(arr.std()),
+        "min": float(arr.min()),
+        "max": float(arr.max()),
+        "count": arr.size
     }
 
 def detect_trend(data: List[float], years: List[int]) -> Dict[str, Any]:
@@ -32,21 +45,23 @@ def detect_trend(data: List[float], years: List[int]) -> Dict[str, Any]:
     if len(data) < 2 or len(years) < 2:
         return {"trend": 0, "slope": 0, "r_squared": 0}
     
-    # Calculate linear regression manually
-    n = len(data)
-    sum_x = sum(years)
-    sum_y = sum(data)
-    sum_xy = sum(x * y for x, y in zip(years, data))
-    sum_x2 = sum(x * x for x in years)
+    # Least squares on mean-centred arrays (same fit as the raw-sum formula, without its cancellation)
+    x = _as_f64(years)
+    y = _as_f64(data)
+    dx = x - x.mean()
+    dy = y - y.mean()
+    sxx = np.dot(dx, dx)
+    if sxx == 0:
+        return {"trend": 0, "slope": 0, "r_squared": 0}
     
     # Calculate slope and intercept
-    slope = (n * sum_xy - sum_x * sum_y) / (n * sum_x2 - sum_x * sum_x)
-    intercept = (sum_y - slope * sum_x) / n
+    slope = float(np.dot(dx, dy) / sxx)
+    intercept = float(y.mean() - slope * x.mean())
     
     # Calculate R-squared
-    y_pred = [slope * x + intercept for x in years]
-    ss_res = sum((y - pred) ** 2 for y, pred in zip(data, y_pred))
-    ss_tot = sum((y - sum_y/n) ** 2 for y in data)
+    resid = dy - slope * dx
+    ss_res = np.dot(resid, resid)
+    ss_tot = np.dot(dy, dy)
     r_squared = 1 - (ss_res / ss_tot) if ss_tot != 0 else 0
     
     return {
@@ -62,16 +77,10 @@ def format_anomaly_description(anomaly_type: str, value: float,
     """
     Format a human-readable anomaly description
     """
+    unit = ANOMALY_UNITS.get(anomaly_type, "")
     deviation = value - expected
     deviation_str = f"+{deviation:.2f}" if deviation > 0 else f"{deviation:.2f}"
     
-    if anomaly_type == "temperature":
-        unit = "°C"
-    elif anomaly_type == "precipitation":
-        unit = "mm"
-    else:
-        unit = ""
-    
     return f"{anomaly_type.title()} anomaly in {year}: {value:.2f}{unit} (expected: {expected:.2f}{unit}, deviation: {deviation_str}{unit})"
 
 def categorize_severity(z_score: float) -> str:
@@ -79,14 +88,18 @@ def categorize_severity(z_score: float) -> str:
     Categorize anomaly severity based on z-score
     """
     abs_z = abs(z_score)
-    if abs_z >= 3.0:
-        return "extreme"
-    elif abs_z >= 2.0:
-        return "high"
-    elif abs_z >= 1.5:
-        return "medium"
-    else:
-        return "low"
+    if abs_z != abs_z:  # NaN compares false against every bound
+        return SEVERITY_LABELS[0]
+    return SEVERITY_LABELS[bisect_right(SEVERITY_Z_BOUNDS, abs_z)]
+
+def categorize_severities(z_scores: List[float]) -> List[str]:
+    """
+    Categorize anomaly severity for many z-scores at once
+    """
+    abs_z = np.abs(_as_f64(z_scores))
+    levels = np.searchsorted(SEVERITY_Z_BOUNDS, abs_z, side='right')
+    levels[np.isnan(abs_z)] = 0
+    return np.asarray(SEVERITY_LABELS)[levels].tolist()
 
 def calculate_moving_average(data: List[float], window: int = 10) -> List[float]:
     """
@@ -95,14 +108,15 @@ def calculate_moving_average(data: List[float], window: int = 10) -> List[float]
     if len(data) < window:
         return data
     
-    moving_avg = []
-    for i in range(len(data)):
-        start = max(0, i - window // 2)
-        end = min(len(data), i + window // 2 + 1)
-        window_data = data[start:end]
-        moving_avg.append(sum(window_data) / len(window_data))
+    # Centred windows (clipped at the edges) summed from a running total in O(n)
+    arr = _as_f64(data)
+    n = arr.size
+    cumsum = np.concatenate(([0.0], np.cumsum(arr)))
+    idx = np.arange(n)
+    start = np.maximum(0, idx - window // 2)
+    end = np.minimum(n, idx + window // 2 + 1)
     
-    return moving_avg
+    return ((cumsum[end] - cumsum[start]) / (end - start)).tolist()
 
 def find_extreme_values(data: List[float], threshold: float = 2.0) -> List[int]:
     """
@@ -111,20 +125,14 @@ def find_extreme_values(data: List[float], threshold: float = 2.0) -> List[int]:
     if not data:
         return []
     
-    mean_val = sum(data) / len(data)
-    variance = sum((x - mean_val) ** 2 for x in data) / len(data)
-    std_val = math.sqrt(variance)
+    arr = _as_f64(data)
+    mean_val = arr.mean()
+    std_val = arr.std()
     
     if std_val == 0:
         return []
     
-    extreme_indices = []
-    for i, value in enumerate(data):
-        z_score = abs((value - mean_val) / std_val)
-        if z_score >= threshold:
-            extreme_indices.append(i)
-    
-    return extreme_indices
+    return np.flatnonzero(np.abs((arr - mean_val) / std_val) >= threshold).tolist()
 
 def prepare_chart_data(weather_data: List[Dict[str, Any]], 
                       anomaly_data: List[Dict[str, Any]]) -> Dict[str, Any]:
@@ -134,25 +142,26 @@ def prepare_chart_data(weather_data: List[Dict[str, Any]],
     if not weather_data:
         return {}
     
-    # Extract time series data
-    years = [d['year'] for d in weather_data]
-    temps = [d['tas_avg'] for d in weather_data]
-    precip = [d['pr_total'] for d in weather_data]
+    # Extract time series data in a single pass over the records
+    years, temps, precip = (
+        list(column) for column in zip(*((d['year'], d['tas_avg'], d['pr_total']) for d in weather_data))
+    )
     
-    # Calculate trends
-    temp_trend = detect_trend(temps, years)
-    precip_trend = detect_trend(precip, years)
+    # Calculate trends (the year array is converted once and shared)
+    years_arr = _as_f64(years)
+    temp_trend = detect_trend(temps, years_arr)
+    precip_trend = detect_trend(precip, years_arr)
     
     # Prepare anomaly data for visualization
-    anomaly_points = []
-    for anomaly in anomaly_data:
-        if 'year' in anomaly:
-            anomaly_points.append({
-                "year": anomaly['year'],
-                "value": anomaly['value'],
-                "severity": anomaly['severity'],
-                "type": anomaly['anomaly_type']
-            })
+    anomaly_points = [
+        {
+            "year": anomaly['year'],
+            "value": anomaly['value'],
+            "severity": anomaly['severity'],
+            "type": anomaly['anomaly_type']
+        }
+        for anomaly in anomaly_data if 'year' in anomaly
+    ]
     
     return {
         "years": years,
@@ -182,7 +191,7 @@ def sanitize_location(location: str) -> str:
     # Remove special characters and normalize
     sanitized = location.strip().lower()
     sanitized = sanitized.replace(" ", "_")
-    sanitized = "".join(c for c in sanitized if c.isalnum() or c == "_")
+    sanitized = LOCATION_STRIP_PATTERN.sub("", sanitized)
     return sanitized or "default"
 
 def format_api_response(success: bool, message: str, 
@@ -212,13 +221,23 @@ def calculate_percentile_rank(value: float, data: List[float]) -> float:
     if not data:
         return 0.0
     
-    sorted_data = sorted(data)
-    rank = 0
-    for i, d in enumerate(sorted_data):
-        if d <= value:
-            rank = i + 1
+    # Rank = number of values <= value, found by binary search on the sorted data
+    sorted_data = np.sort(_as_f64(data))
+    rank = int(np.searchsorted(sorted_data, value, side='right'))
     
-    return (rank / len(sorted_data)) * 100
+    return (rank / sorted_data.size) * 100
+
+def calculate_percentile_ranks(values: List[float], data: List[float]) -> List[float]:
+    """
+    Calculate the percentile rank of each value in a dataset, sorting the data once
+    """
+    if not data:
+        return [0.0] * len(values)
+    
+    sorted_data = np.sort(_as_f64(data))
+    ranks = np.searchsorted(sorted_data, _as_f64(values), side='right')
+    
+    return (ranks / sorted_data.size * 100).tolist()
 
 def get_seasonal_patterns(data: List[Dict[str, Any]]) -> Dict[str, Any]:
     """
@@ -227,27 +246,21 @@ def get_seasonal_patterns(data: List[Dict[str, Any]]) -> Dict[str, Any]:
     if not data or 'month' not in data[0]:
         return {}
     
-    # Group by month
-    monthly_data = {}
-    for record in data:
-        month = record.get('month', 1)
-        if month not in monthly_data:
-            monthly_data[month] = []
-        monthly_data[month].append(record)
+    import pandas as pd
     
-    # Calculate monthly averages
-    monthly_stats = {}
-    for month, records in monthly_data.items():
-        temps = [r['tas_avg'] for r in records]
-        precip = [r['pr_total'] for r in records]
-        
-        monthly_stats[month] = {
-            "avg_temperature": sum(temps) / len(temps),
-            "avg_precipitation": sum(precip) / len(precip),
-            "count": len(records)
-        }
+    # Group by month, keyed exactly as stored (a missing month counts as 1, a None month stays None)
+    month_codes: Dict[Any, int] = {}
+    df = pd.DataFrame(data, columns=['tas_avg', 'pr_total'])
+    df['month_code'] = [month_codes.setdefault(record.get('month', 1), len(month_codes)) for record in data]
+    
+    # Calculate monthly averages (codes follow first appearance, so months keep that order)
+    monthly_stats = df.groupby('month_code').agg(
+        avg_temperature=('tas_avg', 'mean'),
+        avg_precipitation=('pr_total', 'mean'),
+        count=('tas_avg', 'size')
+    )
     
-    return monthly_stats
+    return dict(zip(month_codes, monthly_stats.to_dict(orient='records')))
 
 def export_data_to_csv(data: List[Dict[str, Any]], filename: str) -> bool:
     """
@@ -270,16 +283,13 @@ def export_data_to_csv(data: List[Dict[str, Any]], filename: str) -> bool:
 
 def load_data_from_csv(filename: str) -> List[Dict[str, Any]]:
     """
-    Load data from CSV file using built-in csv module
+    Load data from CSV file as string-valued records using pandas' C parser
     """
     try:
-        import csv
-        data = []
-        with open(filename, 'r', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                data.append(row)
-        return data
+        import pandas as pd
+        
+        df = pd.read_csv(filename, encoding='utf-8', dtype=str, keep_default_na=False)
+        return df.to_dict(orient='records')
     except Exception as e:
         print(f"Error loading data: {e}")
         return []